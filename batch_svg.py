@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+"""Convert many .blk files to SVG in parallel
+
+Each file goes through parse -> build_grid -> build_svg in a worker
+process. A file that fails is reported and the rest are converted."""
+
+from typing import Iterable, Optional
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import glob
+import argparse
+import build_svg as BS
+import instrument
+from render_cache import RenderCache, open_cache
+from cli import autocomplete
+
+
+def find_blk_files(patterns: Iterable[str]) -> list[str]:
+    """Return .blk files in directories or matching glob PATTERNS"""
+
+    found: dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = glob.glob(os.path.join(pattern, "*.blk"))
+        else:
+            paths = glob.glob(pattern)
+        for path in sorted(paths):
+            found[os.path.normpath(path)] = None
+    return list(found)
+
+
+def svg_name(blk_file: str, output_dir: str) -> str:
+    stem: str = os.path.splitext(os.path.basename(blk_file))[0]
+    return os.path.join(output_dir, stem + ".svg")
+
+
+Job = tuple[str, str, Optional[str], int, Optional[str]]
+
+
+def convert(job: Job) -> Optional[str]:
+    """Render one (blk_file, svg_file, cache_dir, cache_bytes, instrument) job
+
+    With an instrument sink kind its report is written next to the SVG
+    file. Return error message or None"""
+
+    blk_file, svg_file, cache_dir, cache_bytes, sink_kind = job
+    try:
+        cache: Optional[RenderCache] = None
+        if cache_dir:
+            cache = open_cache(cache_dir, cache_bytes)
+        if sink_kind:
+            suffix: str = os.path.splitext(instrument.sinks[sink_kind][1])[1]
+            report: str = os.path.splitext(svg_file)[0] + suffix
+            with instrument.use_sink(instrument.make_sink(sink_kind, report)):
+                BS.render_file(blk_file, svg_file, cache)
+        else:
+            BS.render_file(blk_file, svg_file, cache)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def convert_all(
+    blk_files: list[str],
+    output_dir: str,
+    jobs: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    cache_bytes: int = 256 << 20,
+    sink_kind: Optional[str] = None,
+) -> dict[str, str]:
+    """Convert BLK_FILES into OUTPUT_DIR using JOBS processes
+
+    With SINK_KIND every file gets an instrument report beside its SVG.
+    Return failed files mapped to their error messages."""
+
+    failed: dict[str, str] = {}
+    todo: list[Job] = []
+    targets: dict[str, str] = {}
+    for blk_file in blk_files:
+        svg_file: str = svg_name(blk_file, output_dir)
+        if svg_file in targets:
+            failed[blk_file] = f"{svg_file} is also written for {targets[svg_file]}"
+        else:
+            targets[svg_file] = blk_file
+            todo.append((blk_file, svg_file, cache_dir, cache_bytes, sink_kind))
+    os.makedirs(output_dir, exist_ok=True)
+    errors: list[Optional[str]]
+    if jobs == 1:
+        errors = list(map(convert, todo))
+    else:
+        workers: int = jobs or os.cpu_count() or 1
+        chunksize: int = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            errors = list(executor.map(convert, todo, chunksize=chunksize))
+    for (blk_file, *_), error in zip(todo, errors):
+        if error is not None:
+            failed[blk_file] = error
+    return failed
+
+
+parser = argparse.ArgumentParser(
+    description="Convert .blk files to SVG in parallel",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+parser.add_argument(
+    "inputs", nargs="+", help=".blk files, directories or glob patterns"
+)
+parser.add_argument("-o", "--output-dir", default=".", help="Directory for SVG files")
+parser.add_argument(
+    "-j", "--jobs", type=int, default=None, help="Worker processes (CPU count)"
+)
+parser.add_argument("--cache-dir", help="Directory of rendered SVG cache")
+parser.add_argument(
+    "--cache-size", type=int, default=256, help="Render cache limit (MiB)"
+)
+parser.add_argument(
+    "--instrument",
+    choices=list(instrument.sinks),
+    help="Write a JSON or cProfile report of every file beside its SVG",
+)
+
+if __name__ == "__main__":
+    autocomplete(parser)
+    args = parser.parse_args()
+    blk_files: list[str] = find_blk_files(args.inputs)
+    failed: dict[str, str] = convert_all(
+        blk_files,
+        args.output_dir,
+        args.jobs,
+        args.cache_dir,
+        args.cache_size << 20,
+        args.instrument,
+    )
+    for blk_file, error in failed.items():
+        print(f"{blk_file}: {error}", file=sys.stderr)
+    print(f"{len(blk_files) - len(failed)} of {len(blk_files)} files converted")
+    sys.exit(1 if failed else 0)
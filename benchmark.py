@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+"""Time every stage of the .blk to SVG pipeline on generated documents
+
+Documents are generated, deterministically, in four shapes: one wide
+row, many tall rows, deeply nested blocks and rows full of tags. Every
+stage is timed on its own (best of `repeat' runs) and run once more
+under tracemalloc for its peak memory. Results are written as JSON and
+can be compared with the results of another commit."""
+
+from typing import Any, Callable, Optional
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+from cli import autocomplete
+
+colors: tuple[str, ...] = ("red", "green", "blue", "White", "#00CCDE", "lightgray")
+
+
+def _item(rng: random.Random, index: int, tags: str = "") -> str:
+    return f"[{rng.choice(colors)}: item {index}{tags}]"
+
+
+def wide(size: int, rng: random.Random) -> str:
+    """One row of SIZE blocks"""
+
+    items = " ".join(_item(rng, i) for i in range(size))
+    return f"[#00CCDE: Wide\n{items}\n]\n"
+
+
+def tall(size: int, rng: random.Random) -> str:
+    """SIZE blocks, three to a row"""
+
+    lines = ["[#00CCDE: Tall"]
+    for first in range(0, size, 3):
+        lines.append(" ".join(_item(rng, i) for i in range(first, first + 3)))
+    return "\n".join(lines) + "\n]\n"
+
+
+def deep(size: int, rng: random.Random) -> str:
+    """SIZE blocks nested in each other, each with a sibling leaf"""
+
+    opening = "".join(f"[{rng.choice(colors)}: level {i} [] " for i in range(size))
+    return f"[#00CCDE: Deep\n{opening}\n{']' * size}\n]\n"
+
+
+def tagged(size: int, rng: random.Random) -> str:
+    """SIZE blocks with :center and :nostroke, eight to a row"""
+
+    choices = ("", " :nostroke", " :center", " :center :nostroke")
+    lines = ["[#00CCDE: Tagged :center"]
+    for first in range(0, size, 8):
+        lines.append(
+            " ".join(
+                _item(rng, i, rng.choice(choices)) for i in range(first, first + 8)
+            )
+        )
+    return "\n".join(lines) + "\n]\n"
+
+
+shapes: dict[str, Callable[[int, random.Random], str]] = {
+    "wide": wide,
+    "tall": tall,
+    "deep": deep,
+    "tagged": tagged,
+}
+
+
+def generate(shape: str, size: int, seed: int = 0) -> str:
+    """Return .blk document of SHAPE with about SIZE blocks"""
+
+    return shapes[shape](size, random.Random(seed))
+
+
+def measure(function: Callable[[], Any], repeat: int) -> tuple[dict[str, Any], Any]:
+    """Return timing and peak memory of FUNCTION, and its result"""
+
+    seconds: float = math.inf
+    result: Any = None
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        result = function()
+        seconds = min(seconds, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        peak: int = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}, result
+
+
+def _svg(grid: Any) -> int:
+    stream = io.StringIO()
+    BS.build_svg(grid, stream)
+    return len(stream.getvalue())
+
+
+def run_stages(source: str, repeat: int = 3) -> dict[str, dict[str, Any]]:
+    """Return measurements of every pipeline stage on SOURCE"""
+
+    results: dict[str, dict[str, Any]] = {}
+
+    def stage(name: str, function: Callable[[], Any]) -> Any:
+        try:
+            results[name], result = measure(function, repeat)
+        except RecursionError:
+            results[name] = {"error": "RecursionError"}
+            return None
+        return result
+
+    block = stage("parse", lambda: RS.parse_block(source, 0, RS.Cell(0, 0))[0])
+    grid = stage("build_grid", lambda: RG.build_grid(block, [[]], RS.Cell(0, 0))[0])
+    compact = stage("compact_grid", lambda: RG.CompactGrid.from_block(block))
+    if grid is not None:
+        columns: int = BS.get_size(grid).columns
+        stage("align_rows", lambda: BS.align_rows(grid, columns))
+        stage("build_svg", lambda: _svg(grid))
+    stage("compact_svg", lambda: _svg(compact))
+    return results
+
+
+def cold_start(repeat: int = 3) -> dict[str, dict[str, Any]]:
+    """Return wall time of fresh processes running the command line
+
+    "python" is the interpreter alone, the rest are cli.py subcommands
+    on a small generated document."""
+
+    cli: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+    results: dict[str, dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        blk_file: str = os.path.join(directory, "small.blk")
+        with open(blk_file, "w") as f:
+            f.write(generate("tall", 12))
+        commands: dict[str, list[str]] = {
+            "python": ["-c", "pass"],
+            "svg": [cli, "svg", blk_file, "-o", os.path.join(directory, "small.svg")],
+            "scan": [cli, "scan", blk_file],
+        }
+        for name, command in commands.items():
+            seconds: float = math.inf
+            for _ in range(repeat):
+                start: float = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, *command],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    cwd=directory,
+                )
+                seconds = min(seconds, time.perf_counter() - start)
+            results[f"cold_start/{name}"] = {"seconds": seconds}
+    return results
+
+
+def run(
+    shape_names: list[str],
+    sizes: list[int],
+    repeat: int = 3,
+    seed: int = 0,
+    cold: bool = False,
+) -> dict[str, Any]:
+    """Return benchmark results of every shape in every size
+
+    With COLD the start of the command line is measured too."""
+
+    results: dict[str, dict[str, Any]] = {}
+    for shape in shape_names:
+        for size in sizes:
+            source: str = generate(shape, size, seed)
+            for name, result in run_stages(source, repeat).items():
+                results[f"{shape}/{size}/{name}"] = result
+    if cold:
+        results.update(cold_start(repeat))
+    return {
+        "python": platform.python_version(),
+        "commit": _commit(),
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float = 1.2
+) -> list[str]:
+    """Return lines comparing CURRENT to BASELINE
+
+    Stages slower than THRESHOLD times the baseline are marked, unless
+    they took less than a millisecond, where timing is mostly noise."""
+
+    lines: list[str] = []
+    old_results: dict[str, dict[str, Any]] = baseline["results"]
+    for key, new in current["results"].items():
+        old: Optional[dict[str, Any]] = old_results.get(key)
+        if old is None or "seconds" not in old or "seconds" not in new:
+            continue
+        ratio: float = new["seconds"] / old["seconds"] if old["seconds"] else 1.0
+        memory: float = 1.0
+        if old.get("peak_bytes") and "peak_bytes" in new:
+            memory = new["peak_bytes"] / old["peak_bytes"]
+        mark: str = ""
+        if threshold < ratio and 1e-3 <= new["seconds"]:
+            mark = "  REGRESSION"
+        lines.append(f"{key:<32} time {ratio:6.2f}x  memory {memory:6.2f}x{mark}")
+    return lines
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark parse, grid and render stages",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+parser.add_argument(
+    "--shapes", nargs="+", choices=list(shapes), default=list(shapes), help="Shapes"
+)
+parser.add_argument(
+    "--sizes", nargs="+", type=int, default=[100, 1000, 10000], help="Blocks"
+)
+parser.add_argument("--repeat", type=int, default=3, help="Runs per stage")
+parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+parser.add_argument("-o", "--output", help="JSON results file")
+parser.add_argument("--compare", help="JSON results to compare with")
+parser.add_argument(
+    "--threshold", type=float, default=1.2, help="Slowdown counted as regression"
+)
+parser.add_argument(
+    "--cold-start", action="store_true", help="Time start of the command line too"
+)
+parser.add_argument(
+    "--emit", metavar="SHAPE", choices=list(shapes), help="Print document and exit"
+)
+
+if __name__ == "__main__":
+    autocomplete(parser)
+    args = parser.parse_args()
+    if args.emit:
+        sys.stdout.write(generate(args.emit, args.sizes[0], args.seed))
+        raise SystemExit
+    current: dict[str, Any] = run(
+        args.shapes, args.sizes, args.repeat, args.seed, args.cold_start
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    for key, result in current["results"].items():
+        if "peak_bytes" in result:
+            print(
+                f"{key:<32} {result['seconds'] * 1000:10.2f} ms"
+                f" {result['peak_bytes'] / (1 << 20):10.2f} MiB"
+            )
+        elif "seconds" in result:
+            print(f"{key:<32} {result['seconds'] * 1000:10.2f} ms")
+        else:
+            print(f"{key:<32} {result['error']}")
+    if args.compare:
+        with open(args.compare) as f:
+            lines: list[str] = compare(json.load(f), current, args.threshold)
+        print("\n".join(lines))
+        if any(line.endswith("REGRESSION") for line in lines):
+            raise SystemExit(1)
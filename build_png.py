@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+"""Rasterize a grid to PNG, without an SVG renderer
+
+Cells are laid out by build_svg and drawn into an RGB framebuffer. A
+row of cells is composed once as a scanline and copied to all of its
+pixel rows, labels come from an embedded 5x7 bitmap font, and the PNG
+is compressed with zlib. Unlike SVG text, a label is clipped to its
+cell, and colors are the SVG color keywords or #RRGGBB."""
+
+from __future__ import annotations
+from typing import BinaryIO, Iterator, Optional, Union
+from functools import lru_cache
+from itertools import groupby
+from operator import attrgetter
+import zlib
+import struct
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+
+# SVG color keywords
+_color_names: str = """
+aliceblue f0f8ff antiquewhite faebd7 aqua 00ffff aquamarine 7fffd4 azure f0ffff
+beige f5f5dc bisque ffe4c4 black 000000 blanchedalmond ffebcd blue 0000ff
+blueviolet 8a2be2 brown a52a2a burlywood deb887 cadetblue 5f9ea0
+chartreuse 7fff00 chocolate d2691e coral ff7f50 cornflowerblue 6495ed
+cornsilk fff8dc crimson dc143c cyan 00ffff darkblue 00008b darkcyan 008b8b
+darkgoldenrod b8860b darkgray a9a9a9 darkgreen 006400 darkgrey a9a9a9
+darkkhaki bdb76b darkmagenta 8b008b darkolivegreen 556b2f darkorange ff8c00
+darkorchid 9932cc darkred 8b0000 darksalmon e9967a darkseagreen 8fbc8f
+darkslateblue 483d8b darkslategray 2f4f4f darkslategrey 2f4f4f
+darkturquoise 00ced1 darkviolet 9400d3 deeppink ff1493 deepskyblue 00bfff
+dimgray 696969 dimgrey 696969 dodgerblue 1e90ff firebrick b22222
+floralwhite fffaf0 forestgreen 228b22 fuchsia ff00ff gainsboro dcdcdc
+ghostwhite f8f8ff gold ffd700 goldenrod daa520 gray 808080 grey 808080
+green 008000 greenyellow adff2f honeydew f0fff0 hotpink ff69b4
+indianred cd5c5c indigo 4b0082 ivory fffff0 khaki f0e68c lavender e6e6fa
+lavenderblush fff0f5 lawngreen 7cfc00 lemonchiffon fffacd lightblue add8e6
+lightcoral f08080 lightcyan e0ffff lightgoldenrodyellow fafad2
+lightgray d3d3d3 lightgreen 90ee90 lightgrey d3d3d3 lightpink ffb6c1
+lightsalmon ffa07a lightseagreen 20b2aa lightskyblue 87cefa
+lightslategray 778899 lightslategrey 778899 lightsteelblue b0c4de
+lightyellow ffffe0 lime 00ff00 limegreen 32cd32 linen faf0e6 magenta ff00ff
+maroon 800000 mediumaquamarine 66cdaa mediumblue 0000cd mediumorchid ba55d3
+mediumpurple 9370db mediumseagreen 3cb371 mediumslateblue 7b68ee
+mediumspringgreen 00fa9a mediumturquoise 48d1cc mediumvioletred c71585
+midnightblue 191970 mintcream f5fffa mistyrose ffe4e1 moccasin ffe4b5
+navajowhite ffdead navy 000080 oldlace fdf5e6 olive 808000 olivedrab 6b8e23
+orange ffa500 orangered ff4500 orchid da70d6 palegoldenrod eee8aa
+palegreen 98fb98 paleturquoise afeeee palevioletred db7093 papayawhip ffefd5
+peachpuff ffdab9 peru cd853f pink ffc0cb plum dda0dd powderblue b0e0e6
+purple 800080 red ff0000 rosybrown bc8f8f royalblue 4169e1 saddlebrown 8b4513
+salmon fa8072 sandybrown f4a460 seagreen 2e8b57 seashell fff5ee sienna a0522d
+silver c0c0c0 skyblue 87ceeb slateblue 6a5acd slategray 708090
+slategrey 708090 snow fffafa springgreen 00ff7f steelblue 4682b4 tan d2b48c
+teal 008080 thistle d8bfd8 tomato ff6347 turquoise 40e0d0 violet ee82ee
+wheat f5deb3 white ffffff whitesmoke f5f5f5 yellow ffff00 yellowgreen 9acd32
+"""
+_colors: dict[str, bytes] = dict(
+    zip(
+        _color_names.split()[::2],
+        map(bytes.fromhex, _color_names.split()[1::2]),
+    )
+)
+
+# Five columns of every printable ASCII character, top row in bit 0
+_font: bytes = bytes.fromhex(
+    "000000000000005f00000007000700147f147f14242a7f2a1223130864623649552250"
+    "0005030000001c2241000041221c00082a1c2a0808083e080800503000000808080808"
+    "006060000020100804023e5149453e00427f400042615149462141454b311814127f10"
+    "27454545393c4a49493001710905033649494936064949291e00363600000056360000"
+    "0008142241141414141441221408000201510906324979413e7e1111117e7f49494936"
+    "3e414141227f4141221c7f494949417f090901013e414151327f0808087f00417f4100"
+    "2040413f017f081422417f404040407f0204027f7f0408107f3e4141413e7f09090906"
+    "3e4151215e7f09192946464949493101017f01013f4040403f1f2040201f7f2018207f"
+    "63140814630304780403615149454300007f4141020408102041417f00000402010204"
+    "4040404040000102040020545454787f484444383844444420384444487f3854545418"
+    "087e090102081454543c7f0804047800447d40002040443d00007f10284400417f4000"
+    "7c041804787c0804047838444444387c14141408081414187c7c080404084854545420"
+    "043f4440203c4040207c1c2040201c3c4030403c44281028440c5050503c4464544c44"
+    "000836410000007f000000413608000804081008"
+)
+glyph_height: int = 7
+glyph_advance: int = 6  # five columns and a space
+
+background: bytes = _colors["lightgray"]
+text_color: bytes = _colors["black"]
+
+
+def parse_color(color: str) -> Optional[bytes]:
+    """Return RGB of COLOR, None for "None"
+
+    Unknown colors are black, as SVG renderers draw them."""
+
+    if color.startswith("#") and len(color) == 7:
+        try:
+            return bytes.fromhex(color[1:])
+        except ValueError:
+            return text_color
+    name: str = color.lower()
+    if name == "none":
+        return None
+    return _colors.get(name, text_color)
+
+
+@lru_cache(maxsize=4096)
+def _glyph_rows(char: str, paper: bytes, zoom: int) -> tuple[bytes, ...]:
+    """Return pixel rows of CHAR on PAPER, ZOOM pixels per font pixel"""
+
+    code: int = ord(char)
+    if not 32 <= code < 127:
+        code = ord("?")
+    columns: bytes = _font[(code - 32) * 5 :][:5] + b"\0"
+    return tuple(
+        b"".join((text_color if bits >> row & 1 else paper) * zoom for bits in columns)
+        for row in range(glyph_height)
+    )
+
+
+class Framebuffer:
+    """RGB pixels of an image, row after row"""
+
+    def __init__(self, width: int, height: int, color: bytes = background) -> None:
+        self.width: int = width
+        self.height: int = height
+        self.stride: int = 3 * width
+        self.pixels: bytearray = bytearray(color * (width * height))
+
+    def fill(self, x0: int, y0: int, x1: int, y1: int, color: bytes) -> None:
+        """Fill the rectangle from X0, Y0 to X1, Y1 (excluded) with COLOR"""
+
+        x0, x1 = max(x0, 0), min(x1, self.width)
+        y0, y1 = max(y0, 0), min(y1, self.height)
+        if x1 <= x0:
+            return
+        span: bytes = color * (x1 - x0)
+        for start in range(y0 * self.stride + 3 * x0, y1 * self.stride, self.stride):
+            self.pixels[start : start + len(span)] = span
+
+    def row(self, y: int) -> bytearray:
+        """Return a copy of pixel row Y"""
+
+        return self.pixels[y * self.stride : (y + 1) * self.stride]
+
+    def copy_row(self, line: bytes, y0: int, y1: int) -> None:
+        """Set pixel rows from Y0 to Y1 (excluded) to LINE"""
+
+        stride: int = self.stride
+        for start in range(max(y0, 0) * stride, min(y1, self.height) * stride, stride):
+            self.pixels[start : start + stride] = line
+
+    def png(self, level: int = 6) -> bytes:
+        """Return the image as PNG, compressed at zlib LEVEL"""
+
+        stride: int = self.stride
+        view = memoryview(self.pixels)
+        raw: bytes = b"".join(
+            b"\0" + view[start : start + stride]
+            for start in range(0, len(self.pixels), stride)
+        )
+        header: bytes = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return b"".join(
+            (
+                b"\x89PNG\r\n\x1a\n",
+                _chunk(b"IHDR", header),
+                _chunk(b"IDAT", zlib.compress(raw, level)),
+                _chunk(b"IEND", b""),
+            )
+        )
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    crc: int = zlib.crc32(data, zlib.crc32(kind))
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+
+def grid_rects(
+    grid: Union[RG.GridType, RG.CompactGrid],
+) -> tuple[BS.Geometry, Iterator[BS.Rect]]:
+    """Return geometry of `grid' and the Rect of every cell, row by row"""
+
+    if isinstance(grid, RG.CompactGrid):
+        table: BS.CellTable = BS.cell_table(grid)
+        geometry = BS.Geometry.uniform(table.columns, table.rows)
+        return geometry, BS.table_rects(table, geometry)
+    columns, rows = BS.get_size(grid)
+    geometry = BS.Geometry.uniform(columns, rows)
+    return geometry, BS.layout_cells(grid, geometry, columns, rows)
+
+
+def _draw_label(
+    image: Framebuffer, rect: BS.Rect, paper: bytes, scale: int, zoom: int
+) -> None:
+    """Draw the text of RECT centered on it as SVG does, clipped to it"""
+
+    rows: list[tuple[bytes, ...]] = [
+        _glyph_rows(char, paper, zoom) for char in rect.text
+    ]
+    width: int = glyph_advance * zoom * len(rows)
+    center: int = (rect.x + rect.width // 2) * scale
+    start: int = center - (width - zoom) // 2
+    left: int = max(start, rect.x * scale + scale, 0)
+    right: int = min(start + width, (rect.x + rect.width) * scale - scale, image.width)
+    if right <= left:
+        return
+    top: int = (rect.y + BS.rect_height - 3) * scale - glyph_height * zoom
+    inside: range = range(
+        max(rect.y * scale + scale, 0),
+        min((rect.y + BS.rect_height) * scale - scale, image.height),
+    )
+    for row in range(glyph_height):
+        line: bytes = b"".join(glyph[row] for glyph in rows)
+        span: bytes = line[3 * (left - start) : 3 * (right - start)]
+        for y in range(top + row * zoom, top + (row + 1) * zoom):
+            if y in inside:
+                offset: int = y * image.stride + 3 * left
+                image.pixels[offset : offset + len(span)] = span
+
+
+def _draw_row(image: Framebuffer, rects: list[BS.Rect], scale: int) -> None:
+    """Draw RECTS, the cells of one grid row"""
+
+    y0: int = rects[0].y * scale
+    y1: int = y0 + BS.rect_height * scale
+    half: int = scale // 2
+    line: bytearray = image.row(y0)
+    fills: list[Optional[bytes]] = [parse_color(rect.fill) for rect in rects]
+    for rect, color in zip(rects, fills):
+        if color is not None:
+            x0, x1 = rect.x * scale, min((rect.x + rect.width) * scale, image.width)
+            line[3 * x0 : 3 * x1] = color * (x1 - x0)
+    strokes: list[Optional[bytes]] = [parse_color(rect.stroke) for rect in rects]
+    for rect, color in zip(rects, strokes):
+        if color is not None:
+            for edge in (rect.x, rect.x + rect.width):
+                x0 = max(edge * scale - half, 0)
+                x1 = min(edge * scale - half + scale, image.width)
+                line[3 * x0 : 3 * x1] = color * (x1 - x0)
+    image.copy_row(line, y0, y1)
+    for rect, color in zip(rects, strokes):
+        if color is not None:
+            x0, x1 = rect.x * scale - half, (rect.x + rect.width) * scale - half + scale
+            for edge in (y0, y1):
+                image.fill(x0, edge - half, x1, edge - half + scale, color)
+    zoom: int = max(1, round(BS.font_size * scale / 10))
+    for rect, color in zip(rects, fills):
+        if rect.text.strip():
+            _draw_label(
+                image, rect, background if color is None else color, scale, zoom
+            )
+
+
+def rasterize(grid: Union[RG.GridType, RG.CompactGrid], scale: int = 3) -> Framebuffer:
+    """Return image of `grid', SCALE pixels per SVG user unit
+
+    The image has the size build_svg() gives the SVG at SCALE 3."""
+
+    geometry, rects = grid_rects(grid)
+    width, height = geometry.size
+    image = Framebuffer(width * scale, height * scale)
+    for _, row in groupby(rects, key=attrgetter("y")):
+        _draw_row(image, list(row), scale)
+    return image
+
+
+def write_png(
+    grid: Union[RG.GridType, RG.CompactGrid], f: BinaryIO, scale: int = 3
+) -> None:
+    """Write PNG image of `grid' to F, SCALE pixels per SVG user unit"""
+
+    f.write(rasterize(grid, scale).png())
+
+
+def render_file(blk_file: str, png_file: str, scale: int = 3) -> None:
+    """Parse BLK_FILE (.blk or .layout) and write its PNG to PNG_FILE"""
+
+    if blk_file.endswith(".layout"):
+        from layout_file import load_layout
+
+        with load_layout(blk_file) as layout, open(png_file, "wb") as f:
+            write_png(layout, f, scale)
+        return
+    with open(blk_file) as f:
+        block: RS.Block = RS.parse_stream(f)
+    with open(png_file, "wb") as f:
+        write_png(RG.CompactGrid.from_block(block), f, scale)
+
+
+if __name__ == "__main__":
+    import sys
+    from cli import main
+
+    main(["png", *sys.argv[1:]])
@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # PYTHON_ARGCOMPLETE_OK
-from typing import NamedTuple, Optional
-import xml.etree.ElementTree as ET
-import glob
-import argparse
-import argcomplete
+from __future__ import annotations
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TextIO,
+    Union,
+)
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+import io
+import sys
+import math
 import run_scan as RS
 import run_grid as RG
+import instrument
+from text_width import text_width
+from vector_layout import CellTable, cell_table
+
+if TYPE_CHECKING:
+    import xml.etree.ElementTree as ET
+    from render_cache import RenderCache
 
 # screen_width = 1280
 # screen_height = 1024
@@ -15,32 +33,47 @@ rect_width: int = 36
 rect_height: int = 10
 font_size: int = 4
 stroke_thickness: int = 1
+label_padding: int = 2  # between a label and the sides of an auto-width cell
 
 
-def init_svg_root(
-    view_width: int = 114, view_height: int = 84, factor: int = 3
-) -> ET.Element:
-    svg_root = ET.Element(
-        "svg",
+def _root_attributes(
+    view_width: int,
+    view_height: int,
+    factor: int,
+    origin: tuple[int, int] = (0, 0),
+) -> tuple[dict[str, str], dict[str, str]]:
+    """Return attributes of <svg> and of its background <rect>
+
+    The view box starts at ORIGIN, the top-left corner of a tile."""
+
+    x, y = origin
+    return (
         {
             "xmlns": "http://www.w3.org/2000/svg",
             "xmlns:xlink": "http://www.w3.org/1999/xlink",
             "xml:space": "preserve",
             "width": str(view_width * factor),
             "height": str(view_height * factor),
-            "viewBox": f"0 0 {view_width} {view_height}",
+            "viewBox": f"{x} {y} {view_width} {view_height}",
         },
-    )
-    background = ET.Element(
-        "rect",
         {
-            "x": "0px",
-            "y": "0px",
+            "x": f"{x}px",
+            "y": f"{y}px",
             "width": str(view_width * factor),
             "height": str(view_height * factor),
             "fill": "lightgray",
         },
     )
+
+
+def init_svg_root(
+    view_width: int = 114, view_height: int = 84, factor: int = 3
+) -> ET.Element:
+    import xml.etree.ElementTree as ET
+
+    svg_attrib, background_attrib = _root_attributes(view_width, view_height, factor)
+    svg_root = ET.Element("svg", svg_attrib)
+    background = ET.Element("rect", background_attrib)
     svg_root.insert(0, background)
     return svg_root
 
@@ -50,7 +83,7 @@ class Size(NamedTuple):
     rows: int
 
 
-def get_size(grid: RG.GridType) -> Size:
+def get_size(grid: Union[RG.GridType, RG.CompactGrid]) -> Size:
     """Return size (columns, rows) of `grid'"""
 
     rows: int = len(grid)
@@ -70,6 +103,8 @@ def sub_rect(
     stroke: str = "black",
     width: Optional[int] = rect_width,
 ) -> None:
+    import xml.etree.ElementTree as ET
+
     if width is None:
         width = rect_width
     ET.SubElement(
@@ -106,10 +141,7 @@ def rect_start(column: int, row: int) -> Point:
 
     converts column, row to pixel"""
 
-    return Point(
-        _get1_x(column, stroke_thickness, rect_width),
-        _get1_y(row, stroke_thickness, rect_height),
-    )
+    return Point(_get1_x(column), _get1_y(row))
 
 
 def rect_end(column: int, row: int) -> Point:
@@ -117,10 +149,7 @@ def rect_end(column: int, row: int) -> Point:
 
     converts column, row to pixel"""
 
-    return Point(
-        _get2_x(column, stroke_thickness, rect_width),
-        _get2_y(row, stroke_thickness, rect_height),
-    )
+    return Point(_get2_x(column), _get2_y(row))
 
 
 def colrow_xy(col: int, row: int, rect_end: bool = False) -> Point:
@@ -144,10 +173,7 @@ def _get1_x(
         v = stroke_thickness
     if w is None:
         w = rect_width
-    if column == 0:
-        return v
-    else:
-        return _get1_x(column - 1) + w + v + v
+    return v + column * (w + v + v)
 
 
 def _get2_x(
@@ -157,7 +183,7 @@ def _get2_x(
         v = stroke_thickness
     if w is None:
         w = rect_width
-    return _get1_x(column) + w + v
+    return _get1_x(column, v, w) + w + v
 
 
 def _get1_y(
@@ -166,11 +192,8 @@ def _get1_y(
     if v is None:
         v = stroke_thickness
     if h is None:
-        h = rect_width
-    if row == 0:
-        return v
-    else:
-        return _get1_y(row - 1) + h + v + v
+        h = rect_height
+    return v + row * (h + v + v)
 
 
 def _get2_y(
@@ -179,97 +202,672 @@ def _get2_y(
     if v is None:
         v = stroke_thickness
     if h is None:
-        h = rect_width
-    return _get1_y(row) + h + v
+        h = rect_height
+    return _get1_y(row, v, h) + h + v
 
 
-def sort_rows(grid: RG.GridType) -> None:
-    """Rearrange rows in place with :center
+@dataclass
+class Geometry:
+    """Pixel offsets of every column and row
 
-    I assume that a row has only one :center Node."""
+    Computed once per render from the column widths and row heights, so
+    that start() and end() are lookups."""
 
-    columns, rows = get_size(grid)
-    for row_index in range(rows):
-        row: list[RG.Node] = grid[row_index]
+    widths: list[int]
+    heights: list[int]
+    stroke: int = stroke_thickness
+    xs: list[int] = field(init=False)
+    ys: list[int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.xs = self._offsets(self.widths)
+        self.ys = self._offsets(self.heights)
+
+    def _offsets(self, sizes: list[int]) -> list[int]:
+        """Return start of every cell and the total size as the last item"""
+
+        v: int = self.stroke
+        offsets: list[int] = [v]
+        for size in sizes:
+            offsets.append(offsets[-1] + size + v + v)
+        return offsets
+
+    @classmethod
+    def uniform(
+        cls,
+        columns: int,
+        rows: int,
+        width: int = rect_width,
+        height: int = rect_height,
+    ) -> Geometry:
+        return cls([width] * columns, [height] * rows)
+
+    @property
+    def size(self) -> Point:
+        """Return width, height of the whole grid (pixel)"""
+
+        v: int = self.stroke
+        return Point(self.xs[-1] - v, self.ys[-1] - v)
+
+    def start(self, column: int, row: int) -> Point:
+        """Return top-left corner of cell COLUMN, ROW"""
 
-        centered_node: Optional[RG.Node] = next(
-            (node for node in row if ":center" in node.tags), None
+        return Point(self.xs[column], self.ys[row])
+
+    def width(self, column: int, span: int = 1) -> int:
+        """Return width of a cell SPAN columns wide from COLUMN (pixel)"""
+
+        return self.xs[column + span] - self.xs[column] - 2 * self.stroke
+
+    def end(self, column: int, row: int) -> Point:
+        """Return bottom-right corner (next to it) of cell COLUMN, ROW"""
+
+        v: int = self.stroke
+        return Point(
+            self.xs[column] + self.widths[column] + v,
+            self.ys[row] + self.heights[row] + v,
         )
-        if centered_node:
-            mid = columns // 2
-
-            def lightgray_node(c: int, r: int) -> RG.Node:
-                return RG.Node(column=c, row=r, color="lightgray")
-
-            grid[row_index] = (
-                *list(lightgray_node(col, row_index) for col in range(mid)),
-                centered_node,
-                *list(
-                    lightgray_node(col, row_index) for col in range(mid + 1, columns)
-                ),
+
+
+# Index of the cell drawn alone in an aligned row, and its place
+Place = tuple[int, RG.Alignment]
+
+
+def row_place(row: Sequence[RG.Node], columns: int) -> Optional[Place]:
+    """Return Place of the first aligned Node of ROW, None if it has none"""
+
+    for index, node in enumerate(row):
+        if node.tags:
+            place: Optional[RG.Alignment] = RG.alignment(node.tags, columns)
+            if place is not None:
+                return index, place
+    return None
+
+
+def align_rows(
+    grid: Union[RG.GridType, RG.CompactGrid], columns: int
+) -> dict[int, Place]:
+    """Return Place of the cell drawn in every aligned row of `grid'
+
+    A CompactGrid is answered from its index of aligned cells, rows of
+    Nodes are scanned once. `grid' itself is left as it is."""
+
+    if isinstance(grid, RG.CompactGrid):
+        return {
+            row: (
+                grid.positions[cell],
+                RG.alignment(RS.tag_registry.mask_tags[grid.tags[cell]], columns),
             )
+            for row, cell in grid.aligned.items()
+        }
+    places: dict[int, Place] = {}
+    for row_index, row in enumerate(grid):
+        place: Optional[Place] = row_place(row, columns)
+        if place is not None:
+            places[row_index] = place
+    return places
 
 
-def build_svg(grid: RG.GridType) -> ET.Element:
-    x: int = 0
-    y: int = 0
-    v: int = stroke_thickness
+class Rect(NamedTuple):
+    """One grid cell as it is drawn"""
+
+    x: int
+    y: int
+    text: str
+    fill: str
+    stroke: str
     width: int
+
+
+def node_rect(node: RG.Node, x: int, y: int, width: int) -> Rect:
+    """Return Rect of NODE drawn at X, Y"""
+
+    stroke: str = "black"
+    registry: RS.TagRegistry = RS.tag_registry
+    if (
+        registry.tag_masks[node.tags] & registry.masks.get("nostroke", 0)
+        or node.text.strip() == ""
+    ):
+        stroke = "None"
+    return Rect(x, y, node.text, node.color or "lightgray", stroke, width)
+
+
+def _empty_rect(geometry: Geometry, column: int, y: int) -> Rect:
+    return Rect(
+        geometry.xs[column], y, "", "lightgray", "None", geometry.widths[column]
+    )
+
+
+def layout_row(
+    row: Sequence[RG.Node],
+    row_index: int,
+    geometry: Geometry,
+    columns: int,
+    place: Optional[Place] = None,
+    window: Optional[range] = None,
+) -> Iterator[Rect]:
+    """Yield Rect of every cell of ROW
+
+    With PLACE only its Node is drawn, where PLACE puts it, and empty
+    cells fill the rest of the row. With WINDOW only the cells over its
+    columns are yielded."""
+
+    first, end = (0, columns) if window is None else (window.start, window.stop)
+    y: int = geometry.ys[row_index]
+    if place is None:
+        nodes: Iterator[RG.Node] = iter(row[first:end] if first else row)
+        for column_index in range(first, end):
+            node: Optional[RG.Node] = next(nodes, None)
+            if node is None:
+                yield _empty_rect(geometry, column_index, y)
+            else:
+                x: int = geometry.xs[column_index]
+                yield node_rect(node, x, y, geometry.widths[column_index])
+        return
+    index, (offset, span) = place
+    for column_index in range(first, min(offset, end)):
+        yield _empty_rect(geometry, column_index, y)
+    if first < offset + span and offset < end:
+        x = geometry.xs[offset]
+        yield node_rect(row[index], x, y, geometry.width(offset, span))
+    for column_index in range(max(offset + span, first), end):
+        yield _empty_rect(geometry, column_index, y)
+
+
+def layout_cells(
+    grid: Union[RG.GridType, RG.CompactGrid],
+    geometry: Geometry,
+    columns: int,
+    rows: int,
+    places: Optional[dict[int, Place]] = None,
+) -> Iterator[Rect]:
+    """Yield Rect of every cell of `grid', row by row
+
+    Aligned rows are laid out as PLACES, align_rows() by default."""
+
+    if places is None:
+        places = align_rows(grid, columns)
+    for row_index in range(rows):
+        yield from layout_row(
+            grid[row_index], row_index, geometry, columns, places.get(row_index)
+        )
+
+
+def label_width(text: str) -> int:
+    """Return width of a cell fitting TEXT"""
+
+    return math.ceil(text_width(text, font_size)) + 2 * label_padding
+
+
+def _fit_spans(
+    widths: list[int], spanned: Iterable[tuple[int, int, str]], stroke: int
+) -> None:
+    """Widen WIDTHS evenly where a label of SPANNED does not fit
+
+    SPANNED are offset, span and text of every cell drawn over columns."""
+
+    for offset, span, text in spanned:
+        inner: int = sum(widths[offset : offset + span]) + 2 * stroke * (span - 1)
+        missing: int = label_width(text) - inner
+        if 0 < missing:
+            for column in range(offset, offset + span):
+                widths[column] += -(-missing // span)
+
+
+def node_widths(
+    grid: RG.GridType,
+    columns: int,
+    places: dict[int, Place],
+    minimum: int = rect_width,
+) -> list[int]:
+    """Return width of every column of `grid' fitting its labels
+
+    Columns are at least MINIMUM wide. Aligned rows are laid out as
+    PLACES, and cells spanning columns widen all of them."""
+
+    widths: list[int] = [minimum] * columns
+    spanned: list[tuple[int, int, str]] = []
+    for row_index, row in enumerate(grid):
+        place: Optional[Place] = places.get(row_index)
+        if place is not None:
+            index, (offset, span) = place
+            if 1 < span:
+                spanned.append((offset, span, row[index].text))
+                continue
+            row = [row[index]]
+        else:
+            offset = 0
+        for column, node in enumerate(row, offset):
+            if node.text:
+                width: int = label_width(node.text)
+                if widths[column] < width:
+                    widths[column] = width
+    _fit_spans(widths, spanned, stroke_thickness)
+    return widths
+
+
+def table_widths(table: CellTable, minimum: int = rect_width) -> list[int]:
+    """Return width of every column of TABLE fitting its labels
+
+    As node_widths() does, every distinct label is measured once."""
+
+    columns: int = table.columns
+    strings: list[str] = table.strings
+    texts: list[int] = table.texts
+    spanned: list[tuple[int, int, str]] = []
+    if table.spans:
+        texts = list(texts)
+        for row, (offset, span) in table.spans.items():
+            cell: int = row * columns + offset
+            spanned.append((offset, span, strings[texts[cell]]))
+            texts[cell] = 0
+    fits: dict[int, int] = {text: label_width(strings[text]) for text in set(texts)}
+    fits[0] = 0
+    widths: list[int] = [
+        max(minimum, max(map(fits.__getitem__, texts[column::columns]), default=0))
+        for column in range(columns)
+    ]
+    _fit_spans(widths, spanned, stroke_thickness)
+    return widths
+
+
+def build_svg(
+    grid: Union[RG.GridType, RG.CompactGrid],
+    stream: Optional[TextIO] = None,
+    optimize: bool = False,
+    auto_width: bool = False,
+) -> Optional[ET.Element]:
+    """Return SVG tree of `grid'
+
+    With STREAM the markup is written to it directly, exactly as
+    ElementTree would serialize the tree, and None is returned. With
+    OPTIMIZE as well the smaller markup of optimized_svg() is written.
+    With AUTO_WIDTH every column is as wide as its longest label, but
+    at least `rect_width'."""
+
+    sink: instrument.Sink = instrument.current()
+    with sink.span("render"):
+        svg_root, elements = _build_svg(grid, stream, optimize, auto_width)
+    if sink.counting:
+        sink.count("svg.elements", elements)
+    return svg_root
+
+
+def _build_svg(
+    grid: Union[RG.GridType, RG.CompactGrid],
+    stream: Optional[TextIO],
+    optimize: bool,
+    auto_width: bool,
+) -> tuple[Optional[ET.Element], int]:
+    """Return build_svg() result and the number of elements written"""
+
+    if stream is not None and isinstance(grid, RG.CompactGrid):
+        table: CellTable = cell_table(grid)
+        geometry = Geometry.uniform(table.columns, table.rows)
+        if auto_width:
+            geometry = Geometry(table_widths(table), geometry.heights)
+        if optimize:
+            rects: Iterator[Rect] = table_rects(table, geometry)
+            return None, optimized_svg(stream, rects, *geometry.size, 3)
+        stream.write(svg_start(*geometry.size, 3))
+        stream.writelines(table_markup(table, geometry))
+        stream.write("</svg>")
+        cells: int = table.columns * table.rows - sum(
+            span.span - 1 for span in table.spans.values()
+        )
+        return None, 2 + 2 * cells  # <svg>, background
     size: Size = get_size(grid)
     columns, rows = size  # get_size(grid)
-    svg_root: ET.Element = init_svg_root(columns * 38, rows * 12, 3)
-    node: Optional[RG.Node]
-    sort_rows(grid)
-    for row_index in range(rows):
-        for column_index in range(columns):
-            x, y = colrow_xy(column_index, row_index)
-            _x, _y = rect_start(column_index, row_index)
-            assert (x, y) == (_x, _y)
-            # y, x = get_xy(row_index, column_index)
-            try:
-                node = grid[row_index][column_index]
-                assert isinstance(node, RG.Node)
-                if node.color == "":
-                    node.color = "lightgray"
-            except IndexError:
-                node = RG.Node(row_index, column_index, "lightgray")
-            fill, text = node.color, node.text
-            if fill == "":
-                fill = "None"
-            stroke = "black"
-            if ":nostroke" in node.tags or text.strip() == "":
-                stroke = "None"
-            if ":center" in node.tags:
-                width = rect_width * columns + 2 * v
-            else:
-                width = rect_width + 2 * v
-            width = rect_width
-            sub_rect(svg_root, x, y, text, fill, stroke, width)
+    geometry: Geometry = Geometry.uniform(columns, rows)
+    places: dict[int, Place] = align_rows(grid, columns)
+    if auto_width:
+        widths: list[int] = node_widths(grid, columns, places)
+        geometry = Geometry(widths, geometry.heights)
+    view_width, view_height = geometry.size
+    rects = layout_cells(grid, geometry, columns, rows, places)
+    if stream is not None and optimize:
+        return None, optimized_svg(stream, rects, view_width, view_height, 3)
+    cells = columns * rows - sum(place.span - 1 for _, place in places.values())
+    if stream is not None:
+        stream_svg(stream, rects, view_width, view_height, 3)
+        return None, 2 + 2 * cells
+    svg_root: ET.Element = init_svg_root(view_width, view_height, 3)
+    for rect in rects:
+        sub_rect(svg_root, *rect)
     # _view_width, _view_height = rect_end(columns, rows)
     # svg_root.set("viewBox", "0 0 115, 84")
-    return svg_root
+    return svg_root, 2 + 2 * cells
+
+
+# Same escapes as ElementTree applies to attribute values and text
+_attrib_escapes = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "\r": "&#13;",
+        "\n": "&#10;",
+        "\t": "&#09;",
+    }
+)
+_text_escapes = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
+def _start_tag(tag: str, attrib: dict[str, str]) -> str:
+    attributes = "".join(
+        f' {name}="{value.translate(_attrib_escapes)}"'
+        for name, value in attrib.items()
+    )
+    return f"<{tag}{attributes}"
+
+
+def stream_svg(
+    stream: TextIO,
+    rects: Iterable[Rect],
+    view_width: int = 114,
+    view_height: int = 84,
+    factor: int = 3,
+    origin: tuple[int, int] = (0, 0),
+) -> None:
+    """Write <svg> with a <rect>, <text> pair for each of RECTS to STREAM
+
+    The view box starts at ORIGIN."""
+
+    write = stream.write
+    write(svg_start(view_width, view_height, factor, origin))
+    for rect in rects:
+        write(rect_markup(rect))
+    write("</svg>")
+
+
+def svg_start(
+    view_width: int,
+    view_height: int,
+    factor: int = 3,
+    origin: tuple[int, int] = (0, 0),
+) -> str:
+    """Return <svg> start tag followed by the background <rect>"""
+
+    svg_attrib, background_attrib = _root_attributes(
+        view_width, view_height, factor, origin
+    )
+    return (
+        _start_tag("svg", svg_attrib)
+        + ">"
+        + _start_tag("rect", background_attrib)
+        + " />"
+    )
 
 
-parser = argparse.ArgumentParser(
-    description="Build SVG from .blk file",
-    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+def rect_markup(rect: Rect) -> str:
+    """Return <rect>, <text> pair of RECT"""
+
+    x, y, text, fill, stroke, width = rect
+    height: int = rect_height
+    markup: str = (
+        f'<rect x="{x}" y="{y}" width="{width}" height="{height}"'
+        f' fill="{fill.translate(_attrib_escapes)}"'
+        f' stroke="{stroke.translate(_attrib_escapes)}" />'
+        f'<text x="{x + width // 2}" y="{y + height - 3}"'
+        f' text-anchor="middle" font-size="{font_size}"'
+    )
+    if text:
+        return f"{markup}>{text.translate(_text_escapes)}</text>"
+    return markup + " />"
+
+
+def table_markup(table: CellTable, geometry: Geometry) -> Iterator[str]:
+    """Yield markup of every row of TABLE, as rect_markup() writes it"""
+
+    height: int = rect_height
+    xs: list[int] = geometry.xs
+    rect_xs: list[str] = [f'<rect x="{x}" y="' for x in xs[:-1]]
+    sizes: list[str] = [
+        f'" width="{width}" height="{height}" fill="' for width in geometry.widths
+    ]
+    text_xs: list[str] = [
+        f'{x + width // 2}" y="' for x, width in zip(xs, geometry.widths)
+    ]
+    fills: list[str] = [
+        f'{(fill or "lightgray").translate(_attrib_escapes)}" stroke="'
+        for fill in table.strings
+    ]
+    strokes: tuple[str, str] = ('None" /><text x="', 'black" /><text x="')
+    texts: list[str] = [
+        f">{text.translate(_text_escapes)}</text>" if text else " />"
+        for text in table.strings
+    ]
+    columns: int = table.columns
+    for row in range(table.rows):
+        y: int = geometry.ys[row]
+        rect_y: str = str(y)
+        text_y: str = f'{y + height - 3}" text-anchor="middle" font-size="{font_size}"'
+        first: int = row * columns
+        span: Optional[RG.Alignment] = table.spans.get(row)
+        if span is not None:
+            yield "".join(map(rect_markup, _table_row(table, geometry, row)))
+            continue
+        yield "".join(
+            [
+                rect_xs[column]
+                + rect_y
+                + sizes[column]
+                + fills[table.fills[cell]]
+                + strokes[table.strokes[cell]]
+                + text_xs[column]
+                + text_y
+                + texts[table.texts[cell]]
+                for column, cell in enumerate(range(first, first + columns))
+            ]
+        )
+
+
+def _table_row(table: CellTable, geometry: Geometry, row: int) -> Iterator[Rect]:
+    """Yield Rect of every cell of TABLE row ROW"""
+
+    columns: Iterable[int] = range(table.columns)
+    span: Optional[RG.Alignment] = table.spans.get(row)
+    if span is not None:
+        offset: int = span.offset
+        columns = (*range(offset + 1), *range(offset + span.span, table.columns))
+    first: int = row * table.columns
+    y: int = geometry.ys[row]
+    strings: list[str] = table.strings
+    for column in columns:
+        cell: int = first + column
+        width: int = geometry.widths[column]
+        if span is not None and column == span.offset:
+            width = geometry.width(column, span.span)
+        yield Rect(
+            geometry.xs[column],
+            y,
+            strings[table.texts[cell]],
+            strings[table.fills[cell]] or "lightgray",
+            "black" if table.strokes[cell] else "None",
+            width,
+        )
+
+
+def table_rects(table: CellTable, geometry: Geometry) -> Iterator[Rect]:
+    """Yield Rect of every cell of TABLE, as layout_cells() does"""
+
+    for row in range(table.rows):
+        yield from _table_row(table, geometry, row)
+
+
+def optimized_svg(
+    stream: TextIO,
+    rects: Iterable[Rect],
+    view_width: int = 114,
+    view_height: int = 84,
+    factor: int = 3,
+    origin: tuple[int, int] = (0, 0),
+) -> int:
+    """Write <svg> of RECTS to STREAM, smaller than stream_svg() writes it
+
+    Rectangles of the background fill without a stroke are left out, as
+    are empty texts. The other rectangles are a <use> of a shape in
+    <defs>, one for every width, fill and stroke found, and the text
+    attributes are set once in a <style>. The view box starts at ORIGIN.
+    Return the number of elements written."""
+
+    svg_attrib, background_attrib = _root_attributes(
+        view_width, view_height, factor, origin
+    )
+    background: str = background_attrib["fill"]
+    # Id of every shape by width, fill and stroke
+    shapes: dict[tuple[int, str, str], str] = {}
+    cells: list[tuple[str, Rect]] = []  # shape id, "" for text alone
+    for rect in rects:
+        shape: str = ""
+        if rect.fill != background or rect.stroke != "None":
+            key: tuple[int, str, str] = (rect.width, rect.fill, rect.stroke)
+            shape = shapes.get(key, "")
+            if not shape:
+                shape = shapes[key] = f"c{len(shapes)}"
+        elif not rect.text:
+            continue
+        cells.append((shape, rect))
+
+    write = stream.write
+    write(_start_tag("svg", svg_attrib) + ">")
+    write(f"<style>text{{text-anchor:middle;font-size:{font_size}px}}</style><defs>")
+    for (width, fill, stroke), shape in shapes.items():
+        markup: str = (
+            f'<rect id="{shape}" width="{width}" height="{rect_height}"'
+            f' fill="{fill.translate(_attrib_escapes)}"'
+        )
+        if stroke != "None":
+            markup += f' stroke="{stroke.translate(_attrib_escapes)}"'
+        write(markup + "/>")
+    write("</defs>" + _start_tag("rect", background_attrib) + "/>")
+    elements: int = 4 + len(shapes)  # <svg>, <style>, <defs>, background
+    text_y: int = rect_height - 3
+    for shape, (x, y, text, _, _, width) in cells:
+        markup = ""
+        if shape:
+            markup = f'<use xlink:href="#{shape}" x="{x}" y="{y}"/>'
+            elements += 1
+        if text:
+            markup += (
+                f'<text x="{x + width // 2}" y="{y + text_y}">'
+                f"{text.translate(_text_escapes)}</text>"
+            )
+            elements += 1
+        write(markup)
+    write("</svg>")
+    return elements
+
+
+svg_header: str = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+    '<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 20010904//EN"\n'
+    '    "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd">\n'
 )
 
+
+def write_svg(
+    grid: Union[RG.GridType, RG.CompactGrid],
+    f: TextIO,
+    optimize: bool = False,
+    auto_width: bool = False,
+) -> None:
+    """Write SVG document of `grid' to F, as build_svg() does"""
+
+    f.write(svg_header)
+    build_svg(grid, stream=f, optimize=optimize, auto_width=auto_width)
+
+
+@contextmanager
+def open_svg(svg_file: str) -> Iterator[TextIO]:
+    """Open SVG_FILE for writing, gzip compressed if it ends with .svgz
+
+    The gzip header has neither a file name nor a time, so the same SVG
+    is always compressed to the same bytes."""
+
+    if not svg_file.endswith(".svgz"):
+        with open(svg_file, "w", encoding="utf-8") as f:
+            yield f
+        return
+    import gzip
+
+    with open(svg_file, "wb") as raw, gzip.GzipFile(
+        filename="", mode="wb", fileobj=raw, mtime=0
+    ) as compressed, io.TextIOWrapper(compressed, encoding="utf-8") as f:
+        yield f
+
+
+def render_settings(
+    optimize: bool = False, svgz: bool = False, auto_width: bool = False
+) -> dict[str, object]:
+    """Return the module settings that change the rendered SVG
+
+    OPTIMIZE, SVGZ and AUTO_WIDTH are those of render_file(). The tags
+    registered change how a text is parsed and its cell drawn."""
+
+    settings: dict[str, object] = {
+        "tags": RS.tag_registry.fingerprint(),
+        "rect_width": rect_width,
+        "rect_height": rect_height,
+        "font_size": font_size,
+        "stroke_thickness": stroke_thickness,
+        "optimize": optimize,
+        "svgz": svgz,
+    }
+    if auto_width:
+        settings["label_padding"] = label_padding
+    return settings
+
+
+def render_file(
+    blk_file: str,
+    svg_file: str,
+    cache: Optional[RenderCache] = None,
+    optimize: bool = False,
+    auto_width: bool = False,
+) -> None:
+    """Parse BLK_FILE and write its SVG to SVG_FILE
+
+    BLK_FILE "-" is .blk text read from the standard input. A compiled
+    .layout file is rendered without parsing. With CACHE an
+    unchanged source is copied from the cache instead. OPTIMIZE writes
+    the smaller markup of optimized_svg(), AUTO_WIDTH fits the columns
+    to their labels, and an SVG_FILE ending with .svgz is compressed."""
+
+    key: str = ""
+    source: Optional[bytes] = None
+    if blk_file == "-":
+        source = sys.stdin.buffer.read()
+    if cache is not None:
+        settings = render_settings(optimize, svg_file.endswith(".svgz"), auto_width)
+        if source is None:
+            with open(blk_file, "rb") as f:
+                key = cache.key(f.read(), settings)
+        else:
+            key = cache.key(source, settings)
+        if cache.fetch(key, svg_file):
+            return
+    if blk_file.endswith(".layout"):
+        from layout_file import load_layout
+
+        with load_layout(blk_file) as layout, open_svg(svg_file) as f:
+            write_svg(layout, f, optimize, auto_width)
+    else:
+        block: RS.Block
+        if source is not None:
+            block = RS.parse_stream(io.StringIO(source.decode()))
+        else:
+            with open(blk_file) as f:
+                block = RS.parse_stream(f)
+        grid: RG.CompactGrid = RG.CompactGrid.from_block(block)
+        with open_svg(svg_file) as f:
+            write_svg(grid, f, optimize, auto_width)
+    if cache is not None:
+        cache.store(key, svg_file)
+
+
 if __name__ == "__main__":
-    parser.add_argument(
-        "blk_file", help=".blk file to convert to SVG", choices=glob.glob("*.blk")
-    )
-    argcomplete.autocomplete(parser)
-    args = parser.parse_args()
-    block: RS.Block
-    with open(args.blk_file) as f:
-        buf: str = f.read()
-        block = RS.parse_block(buf, 0, RS.Cell(0, 0))[0]
-    grid: RG.GridType = RG.build_grid(block, [[]], RS.Cell(0, 0))[0]
-    # build_svg(grid)
-    tree = ET.ElementTree(build_svg(grid))
-    with open("message.svg", "w", encoding="utf-8") as f:
-        f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
-        f.write('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 20010904//EN"\n')
-        f.write('    "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd">\n')
-        tree.write(f, encoding="unicode")
+    from cli import main
+
+    main(["svg", *sys.argv[1:]])
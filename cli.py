@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+"""Command line of the .blk tools: scan, grid, svg, png and tiles subcommands
+
+Only argparse is loaded to read the command line. Every subcommand
+imports the modules it needs when it runs, and argcomplete is loaded
+only while the shell is completing a command line."""
+
+from typing import Callable, ContextManager, Optional, Sequence, TextIO
+from contextlib import nullcontext
+import os
+import sys
+import argparse
+
+
+def autocomplete(parser: argparse.ArgumentParser) -> None:
+    """Complete the command line if the shell asks for it"""
+
+    if "_ARGCOMPLETE" in os.environ:
+        import argcomplete
+
+        argcomplete.autocomplete(parser)
+
+
+def input_file(*suffixes: str, stdin: bool = False) -> Callable[[str], str]:
+    """Return argument type of existing files ending with SUFFIXES
+
+    With STDIN "-" is the standard input, read as .blk text."""
+
+    def check(path: str) -> str:
+        if stdin and path == "-":
+            return path
+        if not path.endswith(suffixes):
+            raise argparse.ArgumentTypeError(
+                f"{path}: not a {' or '.join(suffixes)} file"
+            )
+        if not os.path.isfile(path):
+            raise argparse.ArgumentTypeError(f"{path}: no such file")
+        return path
+
+    return check
+
+
+def _stem(path: str) -> str:
+    if path == "-":
+        return "stdin"
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def scan(args: argparse.Namespace) -> None:
+    import logging
+    import run_scan as RS
+
+    logging.basicConfig(level=logging.WARN)
+    if args.stream and (args.pickle or args.layout):
+        args.parser.error("--stream keeps no tree for --pickle or --layout")
+    block_parser = RS.BlockParser(keep=not args.stream, history=args.history)
+    opened: ContextManager[TextIO] = nullcontext(sys.stdin)
+    if args.file_to_parse != "-":
+        opened = open(args.file_to_parse)
+    with opened as input:
+        block: RS.Block
+        if args.stream:
+            # Lines, not fixed size chunks, so that blocks are printed as
+            # soon as they are read from a pipe
+            for line in input:
+                for child in block_parser.feed(line):
+                    print(child, flush=True)
+            block = block_parser.close()
+        else:
+            block = RS.parse_stream(input, block_parser=block_parser)
+    if args.pickle:
+        import pickle
+
+        pickle_filename: str = _stem(args.file_to_parse) + ".pickle"
+        with open(pickle_filename, "wb") as pickle_descriptor:
+            pickle.dump(block, pickle_descriptor)
+            print(f"Block saved in {pickle_filename}")
+    if args.layout:
+        from run_grid import CompactGrid
+        from layout_file import save_layout
+
+        layout_filename: str = _stem(args.file_to_parse) + ".layout"
+        save_layout(CompactGrid.from_block(block), layout_filename)
+        print(f"Layout saved in {layout_filename}")
+    if args.history:
+        print(list(block_parser.history))
+    print(block)
+
+
+def grid(args: argparse.Namespace) -> None:
+    if args.pickle.endswith(".layout"):
+        from layout_file import load_layout
+
+        with load_layout(args.pickle) as layout:
+            print(list(layout))
+        return
+    import pickle
+    import run_grid as RG
+
+    with open(args.pickle, "rb") as pickle_file:
+        block = pickle.load(pickle_file)
+    print(RG.build_grid(block)[0])
+
+
+def svg(args: argparse.Namespace) -> None:
+    if args.watch:
+        from watch_svg import Watcher
+
+        try:
+            Watcher(args.watch, args.debounce).run()
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.blk_file is None:
+        args.parser.error("blk_file is required without --watch")
+    import build_svg as BS
+
+    cache = None
+    if args.cache_dir:
+        from render_cache import RenderCache
+
+        cache = RenderCache(args.cache_dir, args.cache_size << 20)
+    if args.instrument:
+        import instrument
+
+        sink = instrument.make_sink(args.instrument, args.instrument_output)
+        with instrument.use_sink(sink):
+            BS.render_file(
+                args.blk_file, args.output, cache, args.optimize, args.auto_width
+            )
+    else:
+        BS.render_file(
+            args.blk_file, args.output, cache, args.optimize, args.auto_width
+        )
+
+
+def png(args: argparse.Namespace) -> None:
+    from build_png import render_file
+
+    render_file(args.blk_file, args.output, args.scale)
+
+
+def tiles(args: argparse.Namespace) -> None:
+    from tile_svg import render_tiles
+
+    manifest = render_tiles(
+        args.blk_file,
+        args.output_dir,
+        args.tile_rows,
+        args.tile_columns,
+        args.jobs,
+        args.optimize,
+        ".svgz" if args.svgz else ".svg",
+    )
+    print(f"{len(manifest['tiles'])} tiles written to {args.output_dir}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="blk",
+        description="Parse .blk files, build their grids and SVG",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser(
+        "scan",
+        help="Parse .blk file",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    scan_parser.add_argument(
+        "file_to_parse",
+        help=".blk file, - for standard input",
+        type=input_file(".blk", stdin=True),
+    )
+    scan_parser.add_argument(
+        "--pickle",
+        action="store_true",
+        help=" Pickle Block object in a file",
+    )
+    scan_parser.add_argument(
+        "--layout",
+        action="store_true",
+        help="Compile grid of the Block to a .layout file",
+    )
+    scan_parser.add_argument(
+        "--history",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Print the last N parser state transitions",
+    )
+    scan_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print every top-level block once it is parsed, keeping none",
+    )
+    scan_parser.set_defaults(run=scan, parser=scan_parser)
+
+    grid_parser = commands.add_parser(
+        "grid",
+        help="Convert tree of Block -s to array",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    grid_parser.add_argument(
+        "pickle",
+        help="Select .picle or .layout file to import",
+        type=input_file(".pickle", ".layout"),
+    )
+    grid_parser.set_defaults(run=grid)
+
+    svg_parser = commands.add_parser(
+        "svg",
+        help="Build SVG from .blk file",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    svg_parser.add_argument(
+        "blk_file",
+        help=".blk or .layout file to convert to SVG, - for standard input",
+        nargs="?",
+        type=input_file(".blk", ".layout", stdin=True),
+    )
+    svg_parser.add_argument(
+        "-o",
+        "--output",
+        help="SVG file, gzip compressed if it ends with .svgz",
+        default="message.svg",
+    )
+    svg_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Write smaller SVG: no invisible cells, shared styles and shapes",
+    )
+    svg_parser.add_argument(
+        "--auto-width",
+        action="store_true",
+        help="Make every column as wide as its longest label",
+    )
+    svg_parser.add_argument("--cache-dir", help="Directory of rendered SVG cache")
+    svg_parser.add_argument(
+        "--cache-size", type=int, default=256, help="Render cache limit (MiB)"
+    )
+    svg_parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Keep rebuilding SVG files of .blk files in DIR as they change",
+    )
+    svg_parser.add_argument(
+        "--debounce", type=float, default=0.3, help="Seconds a change must settle"
+    )
+    svg_parser.add_argument(
+        "--instrument",
+        choices=("json", "cprofile"),
+        help="Report stage timings and counters as JSON, or cProfile the stages",
+    )
+    svg_parser.add_argument(
+        "--instrument-output",
+        metavar="FILE",
+        help="Report file (instrument.json or instrument.pstats)",
+    )
+    svg_parser.set_defaults(run=svg, parser=svg_parser)
+
+    png_parser = commands.add_parser(
+        "png",
+        help="Build PNG image from .blk file",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    png_parser.add_argument(
+        "blk_file",
+        help=".blk or .layout file to convert to PNG",
+        type=input_file(".blk", ".layout"),
+    )
+    png_parser.add_argument("-o", "--output", help="PNG file", default="message.png")
+    png_parser.add_argument(
+        "--scale", type=int, default=3, help="Pixels per SVG user unit"
+    )
+    png_parser.set_defaults(run=png)
+
+    tiles_parser = commands.add_parser(
+        "tiles",
+        help="Build SVG tiles of .blk file in parallel, and their index",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    tiles_parser.add_argument(
+        "blk_file",
+        help=".blk or .layout file to convert",
+        type=input_file(".blk", ".layout"),
+    )
+    tiles_parser.add_argument(
+        "-o", "--output-dir", default="tiles", help="Directory for the tiles"
+    )
+    tiles_parser.add_argument(
+        "--tile-rows", type=int, default=256, help="Grid rows of a tile"
+    )
+    tiles_parser.add_argument(
+        "--tile-columns", type=int, default=64, help="Grid columns of a tile"
+    )
+    tiles_parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Worker processes (CPU count)"
+    )
+    tiles_parser.add_argument(
+        "--optimize", action="store_true", help="Write smaller SVG tiles"
+    )
+    tiles_parser.add_argument(
+        "--svgz", action="store_true", help="Compress the tiles with gzip"
+    )
+    tiles_parser.set_defaults(run=tiles)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser: argparse.ArgumentParser = build_parser()
+    autocomplete(parser)
+    args: argparse.Namespace = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Re-render a .blk document after an edit
+
+Only the top-level blocks (the children of the outermost block) touched
+by the edit are parsed again. Parsing stops as soon as the parser is
+back in the state the previous parse had at the next unchanged
+top-level block, and the grid is rebuilt up to the point where the
+build_grid cursor matches again. Only the grid rows in between are
+rendered again, unless the number of columns has changed.
+
+>>> source = "[#00CCDE: Dialog\\n[red: A] [green: B]\\n[blue: C]\\n]\\n"
+>>> render = IncrementalRender(source)
+>>> render.update(source.replace("B]", "Bee]"))
+range(1, 2)
+>>> render.root.children
+[Block(Cell(1, 0), color="red", text="A"), \
+Block(Cell(1, 1), color="green", text="Bee"), \
+Block(Cell(2, 2), color="blue", text="C")]
+"""
+
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+from parser_state import State
+
+# build_grid cursor and length of its row before a top-level block
+Mark = tuple[RS.Cell, int]
+
+_start = attrgetter("start")
+
+
+def common_prefix(a: str, b: str) -> int:
+    """Return length of the common prefix of A and B"""
+
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def common_suffix(a: str, b: str, limit: int) -> int:
+    """Return length of the common suffix of A and B, at most LIMIT"""
+
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid : len(a) - low] == b[len(b) - mid : len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def localize(block: RS.Block, source: str) -> None:
+    """Make top-level BLOCK independent of the SOURCE it was parsed from
+
+    Its body and those of its descendants refer to a copy of its own
+    text, and the offsets of its descendants become relative to its
+    start, so that an edit before BLOCK only moves BLOCK.start."""
+
+    base: int = block.start
+    text: str = source[base : block.end]
+    if block._source is source:
+        block._source, block._base = text, base
+    stack: list[RS.Block] = list(block.children)
+    while stack:
+        descendant: RS.Block = stack.pop()
+        if descendant._source is source:
+            descendant._source = text
+        descendant.start -= base
+        descendant.end -= base
+        stack.extend(descendant.children)
+
+
+class _Rows(list):
+    """Grid rows from row FIRST on, indexed as in the whole grid"""
+
+    def __init__(self, first: int, rows: list[list[RG.Node]]) -> None:
+        super().__init__(rows)
+        self.first: int = first
+
+    def __getitem__(self, row):
+        return list.__getitem__(self, row - self.first)
+
+
+class IncrementalRender:
+    """Render of a .blk document, updated in place after every edit
+
+    Top-level blocks are made independent of the source by localize().
+    The starts of the top-level blocks from index _gap on are _shift
+    behind the source, so that an edit moves only the blocks between
+    it and the previous edit: block_start() is the up to date one."""
+
+    def __init__(self, source: str) -> None:
+        self.source: str = ""
+        self.root: RS.Block = RS.Block()
+        # The text before the first top-level block sets root color and text
+        self.header_stable: bool = False
+        self._gap: int = 0
+        self._shift: int = 0
+        self.grid: RG.GridType = [[]]
+        self.marks: list[Mark] = []
+        # Number of grid rows of every length
+        self.widths: dict[int, int] = {}
+        self.columns: int = 0
+        self.geometry: BS.Geometry = BS.Geometry.uniform(0, 0)
+        # SVG markup of every grid row
+        self.rows_svg: list[str] = []
+        self.reset(source)
+
+    def reset(self, source: str) -> range:
+        """Parse and render SOURCE from scratch, return rendered rows"""
+
+        block_parser = RS.BlockParser()
+        block_parser.feed(source)
+        root: RS.Block = block_parser.close()
+        self.source, self.root = source, root
+        self._gap = self._shift = 0
+        for child in root.children:
+            localize(child, source)
+        self.header_stable = bool(root.children) and self._header_is_stable()
+        if self.header_stable:
+            # Only the header is needed, do not keep the whole source
+            head = RS.Block(
+                _source=source,
+                _spans=root._spans[: block_parser.body_marks[0]],
+                start=root.start,
+            )
+            root._source, root._base = head.body_str, root.start
+            root._spans = [0, len(root._source)] if root._source else ()
+        self.grid = [[RG.Node(0, 0, root.color, root.text, root.depth, root.tags)]]
+        self.marks = []
+        self._extend_grid(root.children, RS.Cell(0, 0), self.grid, self.marks)
+        self.widths = {}
+        self._count_rows(self.grid, 1)
+        self.columns = max(self.widths)
+        self.rows_svg = [""] * len(self.grid)
+        return self._render(0, len(self.grid))
+
+    @staticmethod
+    def _extend_grid(
+        children: list[RS.Block],
+        last: RS.Cell,
+        grid: RG.GridType,
+        marks: list[Mark],
+    ) -> RS.Cell:
+        """Append top-level CHILDREN to GRID the way build_grid does"""
+
+        for child in children:
+            marks.append((last.dup(), len(grid[last.row])))
+            last = RG.build_grid(child, grid, last.dup())[1].dup()
+            last.column += 1
+        return last
+
+    def _count_rows(self, rows: list[list[RG.Node]], count: int) -> None:
+        """Add COUNT to the number of rows of the lengths of ROWS"""
+
+        widths: dict[int, int] = self.widths
+        for row in rows:
+            width: int = len(row)
+            widths[width] = widths.get(width, 0) + count
+            if not widths[width]:
+                del widths[width]
+
+    def _render(self, first: int, last: int) -> range:
+        """Render grid rows FIRST..LAST-1"""
+
+        columns: int = self.columns
+        geometry: BS.Geometry = self.geometry
+        if len(geometry.xs) != columns + 1 or len(geometry.ys) != len(self.grid) + 1:
+            geometry = self.geometry = BS.Geometry.uniform(columns, len(self.grid))
+        for row_index in range(first, last):
+            row: list[RG.Node] = self.grid[row_index]
+            place = BS.row_place(row, columns)
+            rects = BS.layout_row(row, row_index, geometry, columns, place)
+            self.rows_svg[row_index] = "".join(map(BS.rect_markup, rects))
+        return range(first, last)
+
+    def _header_is_stable(self) -> bool:
+        """Does the text before the first child alone set color and text?"""
+
+        children: list[RS.Block] = self.root.children
+        header: str = self.source[self.root.start + 1 : children[0].start]
+        # What the parser appends to the body out of the header
+        body: str = header.replace("]", "").replace("//", "").replace("/\n", "")
+        match = RS.body_re.match(body)
+        return (
+            match is not None and match.end("text") < len(body) and bool(self.root.text)
+        )
+
+    def block_start(self, index: int) -> int:
+        """Return source offset of top-level block INDEX"""
+
+        start: int = self.root.children[index].start
+        return start if index < self._gap else start + self._shift
+
+    def _move_gap(self, index: int) -> None:
+        """Bring the starts of the top-level blocks up to INDEX up to date"""
+
+        children: list[RS.Block] = self.root.children
+        shift: int = self._shift
+        if index < self._gap:
+            shift = -shift
+        for child in children[min(index, self._gap) : max(index, self._gap)]:
+            child.start += shift
+            child.end += shift
+            child._base += shift
+        self._gap = index
+
+    def update(self, source: str) -> range:
+        """Apply edited SOURCE, return the grid rows rendered again"""
+
+        old: str = self.source
+        prefix: int = common_prefix(old, source)
+        if prefix == len(old) == len(source):
+            return range(0)
+        limit: int = min(len(old), len(source)) - prefix
+        old_end: int = len(old) - common_suffix(old, source, limit)
+        delta: int = len(source) - len(old)
+        if not self.header_stable:
+            return self.reset(source)
+        children: list[RS.Block] = self.root.children
+        gap, shift = self._gap, self._shift
+        first: int = bisect_right(children, prefix, hi=gap, key=_start) - 1
+        if first == gap - 1:
+            first = bisect_right(children, prefix - shift, gap, key=_start) - 1
+        if first < 0:
+            return self.reset(source)
+        self._move_gap(first + 1)
+        # Old starts of the blocks after FIRST are start + shift
+        join: int = bisect_left(children, old_end - shift, first + 1, key=_start)
+
+        # Parse until the parser state matches the old one at a block
+        block_parser = RS.BlockParser(children[first].cell.dup(), State.in_)
+        block_parser.offset = offset = children[first].start
+        while join < len(children):
+            stop: int = children[join].start + shift + delta
+            block_parser.feed(source, offset, stop)
+            offset = stop
+            if (
+                not block_parser.stack
+                and block_parser.state == State.in_
+                and block_parser.cell == children[join].cell
+            ):
+                break
+            join += 1
+        else:
+            block_parser.feed(source, offset)
+            block_parser.close()
+            self.root.end = block_parser.offset
+        new_children: list[RS.Block] = block_parser.block.children
+        for child in new_children:
+            localize(child, source)
+        if join < len(children):
+            self.root.end += delta
+
+        # Rebuild grid until the build_grid cursor matches the old one
+        grid: RG.GridType = self.grid
+        marks: list[Mark] = self.marks
+        last, row_length = marks[first]
+        first_row: int = last.row
+        rows = _Rows(first_row, [grid[first_row][:row_length]])
+        new_marks: list[Mark] = []
+        last = self._extend_grid(new_children, last, rows, new_marks)
+        grid_join: int = join
+        while grid_join < len(children) and last != marks[grid_join][0]:
+            last = self._extend_grid([children[grid_join]], last, rows, new_marks)
+            grid_join += 1
+        end_row: int = len(grid)
+        if grid_join < len(children):
+            join_cursor, join_length = marks[grid_join]
+            end_row = join_cursor.row + 1  # == first_row + len(rows)
+            new_length: int = len(rows[join_cursor.row])
+            rows[join_cursor.row].extend(grid[join_cursor.row][join_length:])
+            for index in range(grid_join, len(marks)):
+                cursor, length = marks[index]
+                if cursor.row != join_cursor.row:
+                    break
+                marks[index] = (cursor, length + new_length - join_length)
+        self._count_rows(grid[first_row:end_row], -1)
+        self._count_rows(rows, 1)
+        grid[first_row:end_row] = rows
+        self.rows_svg[first_row:end_row] = [""] * len(rows)
+        marks[first:grid_join] = new_marks
+        children[first:join] = new_children
+        self._gap = first + len(new_children)
+        self._shift = shift + delta
+        self.source = source
+
+        columns: int = max(self.widths)
+        if columns != self.columns:
+            self.columns = columns
+            return self._render(0, len(grid))
+        return self._render(first_row, first_row + len(rows))
+
+    def svg(self) -> str:
+        """Return the SVG document"""
+
+        columns, rows = self.columns, len(self.grid)
+        view_width, view_height = BS.rect_start(columns, rows)
+        v: int = BS.stroke_thickness
+        return (
+            BS.svg_header
+            + BS.svg_start(view_width - v, view_height - v, 3)
+            + "".join(self.rows_svg)
+            + "</svg>"
+        )
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
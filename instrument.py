@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Timing spans and counters of the parse -> grid -> render pipeline
+
+Pipeline stages report to the sink of the current context, see
+use_sink(). The default Sink ignores everything; code checks its
+`counting' attribute before it adds up anything to report, so an
+uninstrumented run pays one attribute lookup per stage."""
+
+from typing import ContextManager, Iterator, Optional
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import time
+
+_no_span: ContextManager[None] = nullcontext()
+
+
+class Sink:
+    """Sink that ignores spans and counters"""
+
+    counting: bool = False
+
+    def span(self, name: str) -> ContextManager[None]:
+        """Return context manager timing the stage NAME"""
+
+        return _no_span
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class JsonSink(Sink):
+    """Collect spans and counters, write them to PATH as JSON on close"""
+
+    counting = True
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path: Optional[str] = path
+        self.spans: list[dict[str, object]] = []
+        self.counters: dict[str, int] = {}
+        self._start: float = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": start - self._start,
+                    "seconds": time.perf_counter() - start,
+                }
+            )
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict[str, object]:
+        return {"spans": self.spans, "counters": self.counters}
+
+    def close(self) -> None:
+        if self.path is not None:
+            import json
+
+            with open(self.path, "w") as f:
+                json.dump(self.report(), f, indent=2)
+
+
+class ProfileSink(Sink):
+    """Run cProfile inside spans, write pstats data to PATH on close"""
+
+    def __init__(self, path: str) -> None:
+        import cProfile
+
+        self.path: str = path
+        self.profile = cProfile.Profile()
+        self._depth: int = 0  # of nested spans
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        if self._depth == 0:
+            self.profile.enable()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.profile.disable()
+
+    def close(self) -> None:
+        self.profile.dump_stats(self.path)
+
+
+# Sink class and default output file of every --instrument choice
+sinks: dict[str, tuple[type, str]] = {
+    "json": (JsonSink, "instrument.json"),
+    "cprofile": (ProfileSink, "instrument.pstats"),
+}
+
+
+def make_sink(kind: str, path: Optional[str] = None) -> Sink:
+    """Return sink of KIND ("json" or "cprofile") writing to PATH"""
+
+    sink_class, default_path = sinks[kind]
+    return sink_class(default_path if path is None else path)
+
+
+_sink: ContextVar[Sink] = ContextVar("sink", default=Sink())
+
+
+def current() -> Sink:
+    """Return the sink of the current context"""
+
+    return _sink.get()
+
+
+@contextmanager
+def use_sink(sink: Sink) -> Iterator[Sink]:
+    """Report to SINK within the block, close it at the end"""
+
+    token = _sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _sink.reset(token)
+        sink.close()
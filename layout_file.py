@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compiled layout files: a CompactGrid on disk
+
+All integers are little-endian u32 unless noted:
+
+    header      magic "BLKL", version (u16), record size (u16),
+                rows, cells, strings, tags
+    row table   first cell of every row, and the end of the last one
+    records     one per cell: row, position, column, color, text,
+                depth, tag bits
+    tag table   string index of every tag name, the bit order of the
+                tag bits
+    strings     offset of every string and the end of the last one,
+                then the UTF-8 text of all strings
+
+A loaded file is mapped into memory and its tables are used in place,
+so rendering a layout costs neither parsing nor unpickling. Strings are
+decoded when they are first read. Every index in the tables is checked
+against the table it refers to when the file is loaded."""
+
+from __future__ import annotations
+from typing import BinaryIO, Optional, Sequence, Union, overload
+from array import array
+from itertools import compress
+from operator import ge, le
+import mmap
+import struct
+import sys
+import run_grid as RG
+from run_scan import tag_registry
+
+magic: bytes = b"BLKL"
+version: int = 1
+header = struct.Struct("<4sHHIIII")
+fields: int = 7  # u32 per record
+record_size: int = fields * 4
+
+
+class LayoutError(ValueError):
+    pass
+
+
+def _u32(items) -> bytes:
+    words = array("I", items)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tobytes()
+
+
+def write_layout(grid: RG.CompactGrid, stream: BinaryIO) -> None:
+    """Write GRID to the binary STREAM"""
+
+    rows, cells = len(grid), len(grid.positions)
+    strings: list[str] = list(grid.strings)
+    tags: tuple[str, ...] = tag_registry.tags
+    tag_set: set[str] = set(tags)
+    string_ids: dict[str, int] = {
+        string: index for index, string in enumerate(strings) if string in tag_set
+    }
+    for tag in tags:
+        if tag not in string_ids:
+            string_ids[tag] = len(strings)
+            strings.append(tag)
+    tag_ids: list[int] = [string_ids[tag] for tag in tags]
+    records = array("I", bytes(record_size * cells))
+    row_ids = array("I")
+    for row in range(rows):
+        row_ids.extend([row] * (grid.row_starts[row + 1] - grid.row_starts[row]))
+    for index, column in enumerate(
+        (
+            row_ids,
+            grid.positions,
+            grid.columns,
+            grid.colors,
+            grid.texts,
+            grid.depths,
+            grid.tags,
+        )
+    ):
+        records[index::fields] = array("I", column)
+    texts: list[bytes] = [string.encode() for string in strings]
+    offsets: list[int] = [0]
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+
+    stream.write(
+        header.pack(magic, version, record_size, rows, cells, len(texts), len(tag_ids))
+    )
+    stream.write(_u32(grid.row_starts))
+    stream.write(_u32(records))
+    stream.write(_u32(tag_ids))
+    stream.write(_u32(offsets))
+    stream.write(b"".join(texts))
+
+
+class _Strings(Sequence[str]):
+    """Strings of a layout file, decoded when they are first read
+
+    BOUNDS are the offsets of the strings in BLOB and the end of the
+    last one."""
+
+    def __init__(self, blob: memoryview, bounds: memoryview) -> None:
+        self.blob: memoryview = blob
+        self.bounds: memoryview = bounds
+        self._decoded: list[Optional[str]] = [None] * (len(bounds) - 1)
+
+    def __len__(self) -> int:
+        return len(self._decoded)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, list[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        string: Optional[str] = self._decoded[index]
+        if string is None:
+            bounds: memoryview = self.bounds
+            if index < 0:
+                index += len(self)
+            try:
+                string = str(self.blob[bounds[index] : bounds[index + 1]], "utf-8")
+            except UnicodeDecodeError:
+                raise LayoutError(f"string {index} is not UTF-8") from None
+            self._decoded[index] = string
+        return string
+
+    def release(self) -> None:
+        self.blob.release()
+        self.bounds.release()
+
+
+class MappedGrid(RG.CompactGrid):
+    """CompactGrid read from a layout file mapped into memory
+
+    Keep it open while its rows are in use."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self._map: Optional[mmap.mmap] = None
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                raise LayoutError("layout file is truncated") from None
+        try:
+            self._load(self._map)
+        except LayoutError:
+            self.close()
+            raise
+
+    def _words(self, data: mmap.mmap, offset: int, count: int) -> memoryview:
+        words: memoryview = memoryview(data)[offset : offset + 4 * count].cast("I")
+        if sys.byteorder == "big":
+            swapped = array("I", words)
+            words.release()
+            swapped.byteswap()
+            return memoryview(swapped)
+        return words
+
+    def _load(self, data: mmap.mmap) -> None:
+        if len(data) < header.size:
+            raise LayoutError("layout file is truncated")
+        head, version_, size, rows, cells, strings, tags = header.unpack_from(data)
+        if head != magic:
+            raise LayoutError("not a layout file")
+        if version_ != version or size != record_size:
+            raise LayoutError(f"unsupported layout version {version_}")
+        # Offsets of the tables
+        records: int = header.size + 4 * (rows + 1)
+        tag_table: int = records + record_size * cells
+        offsets: int = tag_table + 4 * tags
+        text: int = offsets + 4 * (strings + 1)
+        if len(data) < text:
+            raise LayoutError("layout file is truncated")
+        bounds: memoryview = self._words(data, offsets, strings + 1)
+        if len(data) < text + bounds[-1]:
+            bounds.release()
+            raise LayoutError("layout file is truncated")
+        self.strings = _Strings(memoryview(data)[text : text + bounds[-1]], bounds)
+        if bounds[0] != 0 or not all(map(le, bounds[:-1], bounds[1:])):
+            raise LayoutError("layout file has invalid string offsets")
+        tag_ids = struct.unpack_from(f"<{tags}I", data, tag_table)
+        if any(strings <= i for i in tag_ids):
+            raise LayoutError("tag name out of range")
+        if tuple(self.strings[i] for i in tag_ids) != tag_registry.tags[:tags]:
+            raise LayoutError("layout file has different tags")
+
+        self.row_starts = self._words(data, header.size, rows + 1)
+        cell_words: memoryview = self._words(data, records, fields * cells)
+        self.positions = cell_words[1::fields]
+        self.columns = cell_words[2::fields]
+        self.colors = cell_words[3::fields]
+        self.texts = cell_words[4::fields]
+        self.depths = cell_words[5::fields]
+        self.tags = cell_words[6::fields]
+        cell_words.release()
+        self._aligned = None  # indexed when it is first needed
+        self._check(cells, strings, tags)
+
+    def _check(self, cells: int, strings: int, tags: int) -> None:
+        """Raise LayoutError unless the tables index each other in bounds"""
+
+        row_starts: memoryview = self.row_starts
+        if row_starts[0] != 0 or row_starts[-1] != cells:
+            raise LayoutError("row table does not cover the cells")
+        if not all(map(le, row_starts[:-1], row_starts[1:])):
+            raise LayoutError("row table is not sorted")
+        if not cells:
+            return
+        if strings <= max(self.colors) or strings <= max(self.texts):
+            raise LayoutError("string index out of range")
+        if max(self.tags) >> tags:
+            raise LayoutError("unknown tag bits")
+        # A block's column only counts the blocks before it, so no row is
+        # longer than the grid has cells
+        positions: memoryview = self.positions
+        if cells < max(positions):
+            raise LayoutError("cell position out of range")
+        # Positions go up within rows, so they may only fall at a row start
+        starts: set[int] = set(row_starts)
+        if not all(
+            cell in starts
+            for cell in compress(
+                range(1, cells), map(ge, positions[:-1], positions[1:])
+            )
+        ):
+            raise LayoutError("cell positions are not sorted")
+
+    def intern(self, string: str) -> int:
+        raise TypeError("MappedGrid is read-only")
+
+    def append(self, position, block) -> None:
+        raise TypeError("MappedGrid is read-only")
+
+    def close(self) -> None:
+        """Release the mapping, Nodes read before stay valid"""
+
+        if self._map is not None:
+            for name in (
+                "row_starts",
+                "positions",
+                "columns",
+                "colors",
+                "texts",
+                "depths",
+                "tags",
+            ):
+                view = getattr(self, name)
+                if isinstance(view, memoryview):
+                    view.release()
+                setattr(self, name, array("I", [0] if name == "row_starts" else []))
+            if isinstance(self.strings, _Strings):
+                self.strings.release()
+            self.strings = [""]
+            self._aligned = None
+            self._map.close()
+            self._map = None
+
+    def __enter__(self) -> MappedGrid:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def save_layout(grid: RG.CompactGrid, path: str) -> None:
+    with open(path, "wb") as f:
+        write_layout(grid, f)
+
+
+def load_layout(path: str) -> MappedGrid:
+    """Map the layout file PATH, raise LayoutError if it is not one"""
+
+    return MappedGrid(path)
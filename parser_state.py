@@ -25,16 +25,27 @@ ParserState(buffer='', offset=0, state=<State.void: 1>)
 
 from dataclasses import dataclass
 from enum import Enum
-import logging
+from bisect import bisect_right
 
 State = Enum("State", ["void", "in_", "out", "new_line"])
 
 
 class InvalidState(Exception):
+    """Error at offset CURSOR of the input, on LINE at COLUMN if known"""
+
     def __init__(
-        self, cursor: int, state: State, message: str = "Invalid state"
+        self,
+        cursor: int,
+        state: State,
+        message: str = "Invalid state",
+        line: int = 0,
+        column: int = 0,
     ) -> None:
-        super().__init__(f"{cursor = }: {message = } {state = }")
+        where: str = f", {line = }, {column = }" if line else ""
+        super().__init__(f"{cursor = }: {message = } {state = }{where}")
+        self.cursor: int = cursor
+        self.line: int = line
+        self.column: int = column
 
 
 @dataclass
@@ -46,18 +57,19 @@ class ParserState:
     def make_error(self) -> None:
         raise InvalidState(self.offset, self.state, "Invalid state")
 
-    def log_current_line(self) -> None:
-        lines: dict[int, tuple[int, int]] = self.find_line_boundaries(self.buffer)
-        line_no: int = self.which_line(self.offset, lines)
-        logging.info(f"{self.offset = }, {line_no = }, {self.state = }")
-
     @staticmethod
     def which_line(char_no: int, lines: dict[int, tuple[int, int]]) -> int:
-        """Return the line that has CHAR_NO"""
+        """Return the line that has CHAR_NO
+
+        LINES are numbered from 1 as find_line_boundaries() does, so the
+        line is found by bisecting its numbers."""
 
-        for line_no in lines:
-            val = lines[line_no]
-            if char_no in range(val[0], val[0] + val[1]):
+        line_no: int = bisect_right(
+            range(1, len(lines) + 1), char_no, key=lambda n: lines[n][0]
+        )
+        if line_no:
+            start, length = lines[line_no]
+            if char_no < start + length:
                 return line_no
         return -1  # not found
 
@@ -67,15 +79,14 @@ class ParserState:
 
         line_no: int = 1
         line_start: int = 0
-        line_len: int = 0
         lines: dict[int, tuple[int, int]] = {}
-        for char_no in range(len(buffer)):
-            line_len += 1  # "\n" is last char of any line
-            if buffer[char_no] == "\n":
-                lines[line_no] = (line_start, line_len)
-                line_no += 1
-                line_start = char_no + 1
-                line_len = 0
+        char_no: int = buffer.find("\n")
+        while char_no != -1:
+            # "\n" is last char of any line
+            lines[line_no] = (line_start, char_no + 1 - line_start)
+            line_no += 1
+            line_start = char_no + 1
+            char_no = buffer.find("\n", line_start)
         return lines
 
 
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""On-disk cache of rendered SVG files
+
+Entries are keyed by a hash of the .blk source and the render settings.
+The least recently used entries are removed when the cache grows past
+its size limit. Processes may share a cache directory: one that finds
+the directory changed by another recounts it before storing."""
+
+from typing import Optional
+from functools import lru_cache
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+
+class RenderCache:
+    suffix: str = ".svg"
+
+    def __init__(self, directory: str, max_bytes: int = 256 << 20) -> None:
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        # Bytes in the cache, counted when the directory had _mtime
+        self._size: Optional[int] = None
+        self._mtime: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source: bytes, settings: dict[str, object]) -> str:
+        """Return cache key of SOURCE rendered with SETTINGS"""
+
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def fetch(self, key: str, target: str) -> bool:
+        """Copy the entry KEY to TARGET, return False if it is missing"""
+
+        path: str = self.path(key)
+        try:
+            shutil.copyfile(path, target)
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key: str, source: str) -> None:
+        """Save a copy of the file SOURCE as the entry KEY"""
+
+        path: str = self.path(key)
+        if os.stat(self.directory).st_mtime_ns != self._mtime:
+            self._size = None  # changed by another process
+        try:
+            replaced: int = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_path)
+            # Atomic, so other processes never see a partial entry
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if self._size is None:
+            self._size = self._entries_size()
+        else:
+            self._size += os.path.getsize(path) - replaced
+        if self.max_bytes < self._size:
+            self.evict()
+        self._mtime = os.stat(self.directory).st_mtime_ns
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """Return (last use, size, path) of every entry"""
+
+        entries: list[tuple[float, int, str]] = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted by another process
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _entries_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits max_bytes"""
+
+        entries = sorted(self._entries())
+        size: int = sum(size for _, size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+
+
+@lru_cache(maxsize=None)
+def open_cache(directory: str, max_bytes: int = 256 << 20) -> RenderCache:
+    """Return the RenderCache of DIRECTORY shared within this process"""
+
+    return RenderCache(directory, max_bytes)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+"""Render .blk text to SVG as a service
+
+Requests and responses are lines of JSON, over a local socket or over
+stdin and stdout:
+
+    {"id": 1, "blk": "[red: OK]"}
+    {"id": 1, "svg": "<?xml ..."}   or   {"id": 1, "error": "..."}
+
+Responses come in the order renders finish, so they carry the id of
+their request. Rendering runs in a pool of worker processes started
+and warmed up before the first request. A connection is not read
+further while `max_in_flight' requests are being rendered, and recent
+results are answered from memory."""
+
+from typing import Any, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import io
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+from cli import autocomplete
+
+
+def render_source(source: str) -> str:
+    """Return SVG document of .blk SOURCE"""
+
+    block_parser = RS.BlockParser()
+    block_parser.feed(source)
+    grid = RG.CompactGrid.from_block(block_parser.close())
+    svg = io.StringIO()
+    BS.write_svg(grid, svg)
+    return svg.getvalue()
+
+
+def _render_job(source: str) -> tuple[bool, str]:
+    """Return (True, SVG) of SOURCE, or (False, error message)
+
+    Exceptions are sent back as text, some of them do not unpickle."""
+
+    try:
+        return True, render_source(source)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+class RenderError(Exception):
+    pass
+
+
+def _warm() -> int:
+    """Run the whole pipeline once in a fresh worker"""
+
+    render_source("[#00CCDE: warm :center\n[red: a] [] [b: :nostroke]\n]")
+    return os.getpid()
+
+
+class RenderServer:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_in_flight: int = 64,
+        cache_entries: int = 256,
+        limit: int = 64 << 20,
+    ) -> None:
+        self.workers: int = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_warm)
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        # SVG of recent sources by hash, least recently used first
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        self.cache_entries: int = cache_entries
+        # Renders in progress by hash, shared by identical requests
+        self.pending: dict[str, asyncio.Future[tuple[bool, str]]] = {}
+        self.limit: int = limit  # longest request line
+        self.hits: int = 0
+
+    async def start(self) -> None:
+        """Start the workers and wait until they are warm
+
+        Every worker warms up as it starts; one job per worker makes
+        the pool start all of them."""
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _warm) for _ in range(self.workers))
+        )
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    async def render(self, source: str) -> str:
+        """Return SVG of SOURCE, from the cache or from a worker"""
+
+        key: str = hashlib.sha256(source.encode()).hexdigest()
+        svg: Optional[str] = self.cache.get(key)
+        if svg is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return svg
+        future: Optional[asyncio.Future[tuple[bool, str]]] = self.pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, _render_job, source)
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+        # A cancelled request must not cancel the render of the others
+        ok, result = await asyncio.shield(future)
+        if not ok:
+            raise RenderError(result)
+        return result
+
+    def _finished(self, key: str, future: asyncio.Future[tuple[bool, str]]) -> None:
+        del self.pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        ok, result = future.result()
+        if not ok:
+            return
+        self.cache[key] = result
+        while self.cache_entries < len(self.cache):
+            self.cache.popitem(last=False)
+
+    async def answer(self, line: Optional[bytes]) -> dict[str, Any]:
+        """Return response to the request LINE, None if it was too long"""
+
+        if line is None:
+            return {"id": None, "error": f"request longer than {self.limit} bytes"}
+        try:
+            request: dict[str, Any] = json.loads(line)
+            ident: Any = request.get("id")
+            source: str = request["blk"]
+            if not isinstance(source, str):
+                raise TypeError("blk must be a string")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return {"id": None, "error": f"bad request: {e}"}
+        try:
+            return {"id": ident, "svg": await self.render(source)}
+        except RenderError as e:
+            return {"id": ident, "error": str(e)}
+        except Exception as e:
+            return {"id": ident, "error": f"{type(e).__name__}: {e}"}
+
+    async def _respond(
+        self, line: Optional[bytes], writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            response: dict[str, Any] = await self.answer(line)
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        finally:
+            self.in_flight.release()
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+        """Return the next line of READER, None if it is over the limit
+
+        The rest of a long line is read and dropped, so that it is not
+        taken for the next request."""
+
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:  # the last line
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed: int = e.consumed
+        while True:
+            try:
+                await reader.readexactly(consumed)
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of one connection until it ends"""
+
+        tasks: set[asyncio.Task[None]] = set()
+        try:
+            while True:
+                await self.in_flight.acquire()
+                line: Optional[bytes] = await self._read_line(reader)
+                if line is not None and not line.strip():
+                    self.in_flight.release()
+                    if not line:
+                        break
+                    continue
+                task = asyncio.create_task(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(
+        self, path: Optional[str] = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        """Serve on the unix socket PATH, or on HOST:PORT"""
+
+        server: asyncio.AbstractServer
+        if path:
+            server = await asyncio.start_unix_server(
+                self.handle, path, limit=self.limit
+            )
+        else:
+            server = await asyncio.start_server(
+                self.handle, host, port, limit=self.limit
+            )
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self) -> None:
+        """Answer requests from stdin on stdout"""
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.limit)
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+        )
+        transport, protocol = await loop.connect_write_pipe(
+            asyncio.streams.FlowControlMixin, sys.stdout
+        )
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self.handle(reader, writer)
+
+
+async def request(path: str, sources: list[str]) -> list[dict[str, Any]]:
+    """Render SOURCES on the server at unix socket PATH
+
+    Return the responses in the order of SOURCES."""
+
+    reader, writer = await asyncio.open_unix_connection(path, limit=64 << 20)
+    responses: list[dict[str, Any]] = [{}] * len(sources)
+
+    async def send() -> None:
+        for ident, source in enumerate(sources):
+            writer.write(json.dumps({"id": ident, "blk": source}).encode() + b"\n")
+            await writer.drain()
+
+    async def receive() -> None:
+        for _ in sources:
+            response: dict[str, Any] = json.loads(await reader.readline())
+            responses[response["id"]] = response
+
+    try:
+        await asyncio.gather(send(), receive())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return responses
+
+
+parser = argparse.ArgumentParser(
+    description="Serve .blk to SVG rendering",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+where = parser.add_mutually_exclusive_group(required=True)
+where.add_argument("--socket", metavar="PATH", help="Unix socket to listen on")
+where.add_argument("--port", type=int, help="TCP port to listen on at 127.0.0.1")
+where.add_argument("--stdio", action="store_true", help="Serve stdin and stdout")
+parser.add_argument(
+    "-j", "--jobs", type=int, default=None, help="Worker processes (CPU count)"
+)
+parser.add_argument(
+    "--max-in-flight", type=int, default=64, help="Requests rendered at once"
+)
+parser.add_argument(
+    "--cache-entries", type=int, default=256, help="Recent results kept in memory"
+)
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = RenderServer(args.jobs, args.max_in_flight, args.cache_entries)
+    try:
+        await server.start()
+        if args.stdio:
+            await server.serve_stdio()
+        else:
+            await server.serve(args.socket, port=args.port)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    autocomplete(parser)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -1,29 +1,32 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # PYTHON_ARGCOMPLETE_OK
-from typing import Optional
-from dataclasses import dataclass, field
-import glob
-import argparse
-import pickle
-import argcomplete
-from run_scan import Block, Cell  # noqa: F401
-
-
-parser = argparse.ArgumentParser(
-    description="Convert tree of Block -s to array",
-    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+from __future__ import annotations
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Union,
+    overload,
 )
+from dataclasses import dataclass
+from array import array
+from bisect import bisect_left, bisect_right
+import instrument
+from run_scan import Block, Cell, extract_tags, tag_registry  # noqa: F401
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     row: int = 0
     column: int = 0
     color: str = ""
     text: str = ""
     depth: int = 0
-    tags: list[str] = field(default_factory=list)
+    tags: tuple[str, ...] = ()
 
     def __str____(self):
         return f"[{self.row}, {self.column}] {self.color!r}: {self.text!r}"
@@ -33,35 +36,277 @@ class Node:
 GridType = list[list[Node]]
 
 
+class Alignment(NamedTuple):
+    """Place of the only cell drawn in its row, SPAN columns from OFFSET"""
+
+    offset: int
+    span: int
+
+
+# Tags drawing their cell alone in its row, and where in a row of columns
+_places: dict[str, Callable[[int], Alignment]] = {
+    ":center": lambda columns: Alignment(columns // 2, 1),
+    ":left": lambda columns: Alignment(0, 1),
+    ":right": lambda columns: Alignment(columns - 1, 1),
+    ":span": lambda columns: Alignment(0, columns),
+}
+for _tag, _place in _places.items():
+    tag_registry.register(_tag, place=_place)
+
+
+def alignment(tags: tuple[str, ...], columns: int) -> Optional[Alignment]:
+    """Return place of a cell with TAGS in a row of COLUMNS
+
+    None if the cell is not aligned. Of several alignment tags the first
+    registered wins."""
+
+    semantics: dict[str, dict[str, Any]] = tag_registry.semantics
+    for tag in tags:
+        place: Optional[Callable[[int], Alignment]] = semantics[tag].get("place")
+        if place is not None:
+            return place(columns)
+    return None
+
+
+class CompactRow(Sequence[Node]):
+    """Read-only view of one row of a CompactGrid
+
+    Nodes are created when they are read."""
+
+    def __init__(self, grid: CompactGrid, row: int) -> None:
+        self.grid: CompactGrid = grid
+        self.row: int = row
+        self.start: int = grid.row_starts[row]
+        self.end: int = grid.row_starts[row + 1]
+
+    def __len__(self) -> int:
+        if self.start == self.end:
+            return 0
+        return self.grid.positions[self.end - 1] + 1
+
+    @overload
+    def __getitem__(self, index: int) -> Node: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Node]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Node, list[Node]]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return list(self._nodes(start, stop))
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        positions: array = self.grid.positions
+        cell: int = bisect_left(positions, index, self.start, self.end)
+        if positions[cell] == index:
+            return self.grid.node(self.row, cell)
+        return Node(self.row, self.grid.columns[cell])  # padding
+
+    def __iter__(self) -> Iterator[Node]:
+        return self._nodes(0, len(self))
+
+    def _nodes(self, start: int, stop: int) -> Iterator[Node]:
+        """Yield Nodes START to STOP - 1 of the row"""
+
+        grid: CompactGrid = self.grid
+        index: int = start
+        first: int = bisect_left(grid.positions, start, self.start, self.end)
+        for cell in range(first, self.end):
+            position: int = grid.positions[cell]
+            while index < min(position, stop):
+                yield Node(self.row, grid.columns[cell])  # padding
+                index += 1
+            if stop <= index:
+                return
+            yield grid.node(self.row, cell)
+            index += 1
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (CompactRow, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class CompactGrid(Sequence[CompactRow]):
+    """Grid of build_grid in flat arrays, one item per block
+
+    Colors and texts are interned in `strings', tags are a bit mask over
+    the tags of run_scan.tag_registry. The empty Nodes build_grid pads
+    rows with are not stored: a cell records its index in the row, and
+    the gap before it is padding. Rows read as sequences of Nodes."""
+
+    def __init__(self) -> None:
+        self.strings: list[str] = [""]
+        self._string_ids: dict[str, int] = {"": 0}
+        # First cell of every row, and the end of the last one
+        self.row_starts: array = array("I", [0, 0])
+        # One item per cell
+        self.positions: array = array("I")
+        self.columns: array = array("I")
+        self.colors: array = array("I")
+        self.texts: array = array("I")
+        self.depths: array = array("I")
+        self.tags: array = array("I")
+        # First cell with an alignment tag of every row having one, None
+        # until it is indexed
+        self._aligned: Optional[dict[int, int]] = {}
+
+    def intern(self, string: str) -> int:
+        string_id: Optional[int] = self._string_ids.get(string)
+        if string_id is None:
+            string_id = self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def append(self, position: int, block: Block) -> None:
+        """Add BLOCK at POSITION in the last row"""
+
+        cell: int = len(self.positions)
+        self.positions.append(position)
+        self.columns.append(block.cell.column)
+        self.colors.append(self.intern(block.color))
+        self.texts.append(self.intern(block.text))
+        self.depths.append(block.depth)
+        mask: int = tag_registry.tag_masks[block.tags]
+        self.tags.append(mask)
+        self.row_starts[-1] += 1
+        if mask & tag_registry.masks["place"]:
+            self.aligned.setdefault(len(self.row_starts) - 2, cell)
+
+    @property
+    def aligned(self) -> dict[int, int]:
+        """Return first cell with an alignment tag of every row having one
+
+        Grids built by append() index their cells as they go, others on
+        the first call."""
+
+        if self._aligned is None:
+            row_starts: array = self.row_starts
+            self._aligned = {}
+            align_mask: int = tag_registry.masks["place"]
+            for cell, mask in enumerate(self.tags):
+                if mask & align_mask:
+                    row: int = bisect_right(row_starts, cell) - 1
+                    self._aligned.setdefault(row, cell)
+        return self._aligned
+
+    def node(self, row: int, cell: int) -> Node:
+        strings: list[str] = self.strings
+        return Node(
+            row,
+            self.columns[cell],
+            strings[self.colors[cell]],
+            strings[self.texts[cell]],
+            self.depths[cell],
+            tag_registry.mask_tags[self.tags[cell]],
+        )
+
+    @classmethod
+    def from_block(cls, block: Block) -> CompactGrid:
+        """Return grid of BLOCK, the same as build_grid(BLOCK)"""
+
+        grid = cls()
+        row_starts: array = grid.row_starts
+        row_length: int = 0
+        padded: int = 0
+        sink: instrument.Sink = instrument.current()
+        with sink.span("grid"):
+            for child, new_rows, padding in walk(block, Cell(0, 0)):
+                if new_rows:
+                    row_starts.extend([row_starts[-1]] * new_rows)
+                    row_length = 0
+                row_length += padding
+                padded += padding
+                grid.append(row_length, child)
+                row_length += 1
+        if sink.counting:
+            sink.count("grid.cells", len(grid.positions))
+            sink.count("grid.padded", padded)
+        return grid
+
+    def __len__(self) -> int:
+        return len(self.row_starts) - 1
+
+    @overload
+    def __getitem__(self, index: int) -> CompactRow: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[CompactRow]: ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[CompactRow, list[CompactRow]]:
+        if isinstance(index, slice):
+            return [self[row] for row in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("grid index out of range")
+        return CompactRow(self, index)
+
+
+def walk(block: Block, last: Cell) -> Iterator[tuple[Block, int, int]]:
+    """Yield BLOCK and its descendants in the order build_grid places them
+
+    With every block come the number of rows started before it and the
+    number of padding cells put before it in its row. LAST, the cursor
+    after the previous block, is moved past BLOCK at the end."""
+
+    last_row, last_column = last.row, last.column
+    # Children still to visit, innermost block last
+    stack: list[Iterator[Block]] = [iter((block,))]
+    while stack:
+        child: Optional[Block] = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            if 1 < len(stack):
+                last_column += 1  # after a child
+            continue
+        row, column = child.cell.row, child.cell.column
+        new_rows: int = 0
+        if last_row < row:
+            new_rows, last_row = row - last_row, row
+        padding: int = 0
+        if last_column < column:
+            padding, last_column = column - last_column, column
+        yield child, new_rows, padding
+        stack.append(iter(child.children))
+    last.row, last.column = last_row, last_column
+
+
 def build_grid(
-    block: Block, grid: GridType = [[]], last: Cell = Cell(0, 0)
+    block: Block, grid: Optional[GridType] = None, last: Optional[Cell] = None
 ) -> tuple[GridType, Cell]:
-    row, column = block.cell.row, block.cell.column
-    while last.row < row:
-        grid.append([])
-        last.row += 1
-    while last.column < column:
-        grid[row].append(Node(row, column))
-        last.column += 1
-    grid[row].append(
-        Node(row, column, block.color, block.text, block.depth, block.tags)
-    )
-    for child in block.children:
-        _cell: Cell
-        _, _cell = build_grid(child, grid, last.dup())
-        last = _cell.dup()
-        last.column += 1
+    """Append BLOCK and its children to GRID, a new grid by default
+
+    LAST is the cursor after the previous block, Cell(0, 0) by default.
+    Return the grid and the cursor after BLOCK."""
+
+    if grid is None:
+        grid = [[]]
+    last = Cell(0, 0) if last is None else last.dup()
+    for child, new_rows, padding in walk(block, last):
+        row, column = child.cell.row, child.cell.column
+        if new_rows:
+            grid.extend([] for _ in range(new_rows))
+        cells: list[Node] = grid[row]
+        if padding:
+            cells.extend([Node(row, column) for _ in range(padding)])
+        cells.append(
+            Node(row, column, child.color, child.text, child.depth, child.tags)
+        )
     return grid, last
 
 
 if __name__ == "__main__":
-    argcomplete.autocomplete(parser)
-    parser.add_argument(
-        "pickle", help="Select .picle file to import", choices=glob.glob("*.pickle")
-    )
-    args = parser.parse_args()
-    block: Block
-    with open(args.pickle, "rb") as pickle_file:
-        block = pickle.load(pickle_file)
-    grid: GridType = build_grid(block, [[]], Cell(0, 0))[0]
-    print(grid)
+    import sys
+    from cli import main
+
+    main(["grid", *sys.argv[1:]])
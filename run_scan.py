@@ -2,28 +2,36 @@
 # -*- coding: utf-8 -*-
 # PYTHON_ARGCOMPLETE_OK
 from __future__ import annotations
-import os
 from dataclasses import dataclass, field
-import glob
-import argparse
-import argcomplete
+from array import array
 import re
 import logging
-import pickle
-from parser_state import ParserState, State
-
+import sys
+from sys import intern
+from typing import Any, Callable, Iterator, Optional, Sequence, TextIO
+from collections import deque
+from parser_state import InvalidState, State
+import instrument
 
 # fmt: off
-body_re = re.compile(r"""\s*
-                         (?P<color>\#[\dA-Fa-f]{6}|[a-zA-Z]\w*):
-                         \s*
+# The color of a body and the whitespace before its text
+head_pattern: str = r"""\s*
+                        (?P<color>\#[\dA-Fa-f]{6}|[a-zA-Z]\w*):
+                        \s*"""
+body_re = re.compile(head_pattern + r"""
                          (?P<text>[^][\n]+)
                          \s*""",
                      re.VERBOSE)
+# body_re up to the first colon of the text, where tags may begin
+head_re = re.compile(head_pattern + r"""
+                         (?=[^][\n])
+                         (?P<text>[^][\n:]*)
+                         (?P<colon>:)?""",
+                     re.VERBOSE)
 # fmt: on
 
 
-@dataclass
+@dataclass(slots=True)
 class Cell:
     row: int = 0
     column: int = 0
@@ -41,30 +49,191 @@ class Cell:
         return f"Cell({self.row}, {self.column})"
 
 
-def extract_tags(
-    text: str, tags: tuple[str, ...] = (":nostroke", ":center")
-) -> tuple[str, list[str]]:
+class _Memo(dict):
+    """Dict computing the value of a missing key with `compute'"""
+
+    def __init__(self, compute: Callable[[Any], Any]) -> None:
+        super().__init__()
+        self.compute = compute
+
+    def __missing__(self, key: Any) -> Any:
+        value = self[key] = self.compute(key)
+        return value
+
+
+class TagRegistry:
+    """Tags removed from the text of blocks, and what they mean
+
+    Every tag has a bit of tag masks, in the order tags are registered,
+    and the semantics modules register it with: ":nostroke" has
+    `nostroke', run_grid gives the alignment tags their `place'. All
+    tags are removed from a text in one pass of a compiled pattern."""
+
+    max_tags: int = 32  # bits of a tag mask in a layout file
+
+    def __init__(self) -> None:
+        self.tags: tuple[str, ...] = ()
+        self.bits: dict[str, int] = {}
+        self.semantics: dict[str, dict[str, Any]] = {}
+        # Mask of the tags having every semantic
+        self.masks: dict[str, int] = {}
+        # Tags of every mask, shared by all blocks having them, and mask
+        # of every tags tuple
+        self.mask_tags: dict[int, tuple[str, ...]] = _Memo(self._mask_tags)
+        self.tag_masks: dict[tuple[str, ...], int] = _Memo(self.mask)
+        self._split: Optional[Callable[[str], list[str]]] = None
+        self._tail_split: Optional[Callable[[str], list[Any]]] = None
+
+    def register(self, tag: str, **semantics: Any) -> int:
+        """Make TAG known, with SEMANTICS added to those it has
+
+        Return its bit in tag masks, after the bits of the tags known
+        before. Text parsed from now on has TAG removed."""
+
+        bit: Optional[int] = self.bits.get(tag)
+        if bit is None:
+            if not re.fullmatch(r":[\w-]+", tag):
+                raise ValueError(f"{tag!r}: a tag is a colon and a word")
+            if len(self.tags) == self.max_tags:
+                raise ValueError(f"{tag!r}: no more than {self.max_tags} tags")
+            bit = self.bits[tag] = len(self.tags)
+            self.tags += (tag,)
+            self.semantics[tag] = {}
+            self._split = self._tail_split = None
+        self.semantics[tag].update(semantics)
+        for key, value in semantics.items():
+            if value:
+                self.masks[key] = self.masks.get(key, 0) | 1 << bit
+        return bit
+
+    def mask(self, tags: tuple[str, ...]) -> int:
+        """Return mask of TAGS"""
+
+        mask: int = 0
+        for tag in tags:
+            mask |= 1 << self.bits[tag]
+        return mask
+
+    def _mask_tags(self, mask: int) -> tuple[str, ...]:
+        return tuple(tag for bit, tag in enumerate(self.tags) if mask >> bit & 1)
+
+    def fingerprint(self) -> list[str]:
+        """Return the tags in bit order with their semantics
+
+        Functions are named by module and qualified name, so registries
+        of the same tags give the same fingerprint in every process."""
+
+        def name(value: Any) -> str:
+            if callable(value):
+                return f"{value.__module__}.{value.__qualname__}"
+            return repr(value)
+
+        fingerprint: list[str] = []
+        for tag in self.tags:
+            semantics = sorted(self.semantics[tag].items())
+            words = (f"{key}={name(value)}" for key, value in semantics)
+            fingerprint.append(" ".join((tag, *words)))
+        return fingerprint
+
+    def _pattern(self) -> str:
+        tags: list[str] = sorted(self.tags, key=len, reverse=True)
+        return f"({'|'.join(map(re.escape, tags))})" if tags else "((?!))"
+
+    def parse(
+        self, source: str, pos: int = 0, endpos: int = sys.maxsize
+    ) -> Optional[tuple[str, str, tuple[str, ...]]]:
+        """Return color, text and tags of the body SOURCE[POS:ENDPOS]
+
+        The color and text are those body_re matches, None is returned
+        without them. The tags are removed from the text. Every character
+        is read once: head_re matches in place up to the first colon of
+        the text, and only from there the tags are split off."""
+
+        match = head_re.match(source, pos, endpos)
+        if match is None:
+            return None
+        color, text, colon = match.groups()
+        if colon is None:
+            return color, text, ()
+        if self._tail_split is None:
+            self._tail_split = re.compile(rf"{self._pattern()}|[][\n][\s\S]*").split
+        # Pieces of the text between the tags, and None for its end
+        parts: list[Any] = self._tail_split(source[match.end() - 1 : endpos])
+        bits: dict[str, int] = self.bits
+        if len(parts) == 3:
+            tag: Optional[str] = parts[1]
+            mask: int = 0 if tag is None else 1 << bits[tag]
+            return color, text + parts[0] + parts[2], self.mask_tags[mask]
+        mask = 0
+        for tag in parts[1::2]:
+            if tag is not None:
+                mask |= 1 << bits[tag]
+        return color, text + "".join(parts[::2]), self.mask_tags[mask]
+
+    def extract(self, text: str) -> tuple[str, tuple[str, ...]]:
+        """Remove every tag from TEXT
+
+        Return the text left and the tags found, in the order of their
+        bits."""
+
+        if ":" not in text or not self.tags:
+            return text, ()
+        if self._split is None:
+            self._split = re.compile(self._pattern()).split
+        parts: list[str] = self._split(text)
+        if len(parts) == 1:
+            return text, ()
+        bits: dict[str, int] = self.bits
+        if len(parts) == 3:
+            return parts[0] + parts[2], self.mask_tags[1 << bits[parts[1]]]
+        mask: int = 0
+        for tag in parts[1::2]:
+            mask |= 1 << bits[tag]
+        return "".join(parts[::2]), self.mask_tags[mask]
+
+
+tag_registry = TagRegistry()
+
+# Tags of the parser itself, the first bits of tag masks
+known_tags: tuple[str, ...] = (":nostroke", ":center", ":left", ":right", ":span")
+tag_registry.register(":nostroke", nostroke=True)
+for _tag in known_tags[1:]:
+    tag_registry.register(_tag)
+
+
+def extract_tags(text: str) -> tuple[str, tuple[str, ...]]:
     """Modify TEXT string.
 
-    Remove :nostroke, :center from it. Return modified string and found tags"""
+    Remove the registered tags from it. Return modified string and found
+    tags"""
 
-    found: list[str] = []
-    for tag in tags:
-        if tag in text:
-            text = text.replace(tag, "")
-            found.append(tag)
-    return text, found
+    return tag_registry.extract(text)
 
 
-@dataclass
+@dataclass(slots=True)
 class Block:
     _color: str = ""
     _text: str = ""
     cell: Cell = field(default_factory=Cell)
-    _body: list[str] = field(default_factory=list)
-    children: list[Block] = field(default_factory=list)
+    # The body is made of the i:j slices of _source for i, j pairs in
+    # _spans. Span offsets are relative to start, so mostly small, and
+    # _base is the input offset of _source, normally the whole buffer.
+    # _chunks has (source, base, length of _spans) of the chunks before
+    # _source that the body began in. _spans is None once the body is
+    # known to be all the text between the brackets, and leaves share
+    # empty _spans and children.
+    _source: str = ""
+    _spans: Optional[Sequence[int]] = ()
+    _base: int = 0
+    _chunks: Optional[list[tuple[str, int, int]]] = None
+    children: Sequence[Block] = ()
     depth: int = 0
-    tags: list[str] = field(default_factory=list)
+    tags: tuple[str, ...] = ()
+    # Source offsets of "[" and of the character after "]"
+    start: int = 0
+    end: int = 0
+    # init_text() is done for the current body
+    _text_done: bool = False
 
     @property
     def color(self):
@@ -76,28 +245,89 @@ class Block:
 
     @property
     def body_str(self) -> str:
-        return "".join(self._body)
+        return "".join(self._pieces())
+
+    def _pieces(self) -> Iterator[str]:
+        spans: Optional[Sequence[int]] = self._spans
+        if spans is None:
+            offset: int = self.start - self._base
+            yield self._source[offset + 1 : self.end - self._base - 1]
+            return
+        chunks: list[tuple[str, int, int]] = self._chunks or []
+        first: int = 0
+        for source, base, last in (*chunks, (self._source, self._base, len(spans))):
+            offset = self.start - base
+            for i in range(first, last, 2):
+                yield source[offset + spans[i] : offset + spans[i + 1]]
+            first = last
 
     def init_text(self) -> Block:
         """Extract COLOR, TEXT stromgs from body_str
 
         Set corresponding class attributes"""
-        match = body_re.match(self.body_str)
-        if match:
-            color, text = match.groups()
-            if color:
-                self._color = color
-            if text:
-                self._text, self.tags = extract_tags(text)
+        if self._text_done:
+            return self
+        self._text_done = True
+        spans: Optional[Sequence[int]] = self._spans
+        inside: int = self.end - self.start - 1
+        if spans and len(spans) == 2 and spans[0] == 1 and spans[1] == inside:
+            # The body is all the text between the brackets
+            spans = self._spans = None
+        if spans is None or len(spans) == 2:
+            first, last = (1, inside) if spans is None else spans
+            offset: int = self.start - self._base
+            parsed = tag_registry.parse(self._source, offset + first, offset + last)
+        elif spans:
+            parsed = tag_registry.parse(self.body_str)
+        else:
+            return self
+        if parsed is not None:
+            color, text, self.tags = parsed
+            self._color = intern(color)
+            self._text = intern(text)
         return self
 
-    def append_ch(self, ch: str) -> None:
-        self._body.append(ch)
+    def add_span(self, source: str, start: int, stop: int, base: int = 0) -> None:
+        """Add SOURCE[START:STOP] to the body without copying it
+
+        BASE is the input offset of SOURCE[0]."""
+
+        offset: int = base - self.start
+        start += offset
+        stop += offset
+        spans = self._spans
+        if spans is None:
+            spans = self._spans = [1, self.end - self.start - 1]
+        if not spans:
+            self._source, self._base = source, base
+            self._spans = [start, stop]
+        elif source is self._source and base == self._base and spans[-1] == start:
+            spans[-1] = stop
+        else:
+            if len(spans) == 2:
+                # Bodies of several spans keep offsets unboxed
+                spans = self._spans = array("q", spans)
+            if source is not self._source or base != self._base:
+                # The body goes on in another chunk
+                if self._chunks is None:
+                    self._chunks = []
+                self._chunks.append((self._source, self._base, len(spans)))
+                self._source, self._base = source, base
+            spans.extend((start, stop))
+        self._text_done = False
+
+    def add_child(self, child: Block) -> None:
+        """Append CHILD, the list of children is made for the first one"""
+
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
 
     def __repr__(self):
         result = "Block("
         result += repr(self.cell)
-        if self._body:
+        if self._spans is None or self._spans:
             result += ", "
             self.init_text()
             if self.color:
@@ -112,104 +342,244 @@ class Block:
         return result
 
 
-state_history: list[State] = []
+def _untracked(state: State) -> State:
+    return state
 
 
-def track_state(state: State) -> State:
-    state_history.append(state)
-    return state
+# Everything that is not one of these is body text and is consumed in bulk
+delimiter_re = re.compile(r"[][/\n]")
+
+
+class BlockParser:
+    """Incremental parser of .blk text
+
+    The input is given to feed() in chunks of any size. Nested blocks
+    are kept on an explicit stack, so the nesting depth is not limited
+    by the recursion limit. Runs of body text between delimiters are
+    copied in one slice.
+
+    feed() returns the blocks directly inside the outermost block that
+    were completed by the chunk. With KEEP false they are not attached
+    to the outermost block, which also keeps only the body before its
+    first child, so memory stays bounded by the largest of them.
+    close() ends the input and returns the outermost Block.
+
+    A parser carries all state of one parse, so parsers in different
+    threads are independent. With HISTORY the last HISTORY state
+    transitions are kept in `history', oldest first."""
+
+    def __init__(
+        self,
+        cell: Optional[Cell] = None,
+        state: State = State.void,
+        depth: int = 0,
+        offset: int = 0,
+        keep: bool = True,
+        history: int = 0,
+    ) -> None:
+        self.cell: Cell = Cell(0, 0) if cell is None else cell
+        self.state: State = state
+        self.history: deque[State] = deque(maxlen=history)
+        self.offset: int = offset
+        self.line_no: int = 1
+        # Input offset of the first character on line LINE_NO
+        self.line_start: int = offset
+        self.keep: bool = keep
+        # The outermost block was closed (only for nested DEPTH)
+        self.done: bool = False
+        self.block: Block = Block(cell=self.cell.dup(), children=[], depth=depth)
+        # Enclosing blocks with their states, innermost last
+        self.stack: list[tuple[Block, State]] = []
+        # Length of the outermost block's _spans as each child opened,
+        # only with KEEP
+        self.body_marks: list[int] = []
+        # The outermost block's body ends at its first child, without KEEP
+        self.head_only: bool = False
+
+    def feed(
+        self, chunk: str, start: int = 0, end: Optional[int] = None
+    ) -> list[Block]:
+        """Parse CHUNK[START:END], return completed top-level blocks
+
+        Block bodies refer to CHUNK instead of copying it."""
+
+        completed: list[Block] = []
+        if self.done:
+            return completed
+        pos: int = start
+        if end is None:
+            end = len(chunk)
+        base: int = self.offset - start  # offset of chunk[0] in the input
+        cell: Cell = self.cell
+        state: State = self.state
+        block: Block = self.block
+        stack: list[tuple[Block, State]] = self.stack
+        head_only: bool = self.head_only
+        search = delimiter_re.search
+        log_lines: bool = logging.getLogger().isEnabledFor(logging.INFO)
+        track: Callable[[State], State] = _untracked
+        if self.history.maxlen:
+            track = self._track
+        blocks: int = 0
+        transitions: int = 0
+        try:
+            while pos < end:
+                match = search(chunk, pos, end)
+                stop: int = match.start() if match else end
+                if pos < stop:
+                    if state != State.in_:
+                        raise self._error(base + pos, state)
+                    if stack or not head_only:
+                        block.add_span(chunk, pos, stop, base)
+                    pos = stop
+                    continue
+                ch: str = chunk[pos]
+                if ch == "[":
+                    blocks += 1
+                    if state == State.void:
+                        state = track(State.in_)
+                        transitions += 1
+                        block.start = base + pos
+                    elif state == State.in_:
+                        if stack:
+                            pass
+                        elif self.keep:
+                            self.body_marks.append(len(block._spans))
+                        else:
+                            head_only = True
+                        stack.append((block, state))
+                        state = track(State.in_)
+                        transitions += 1
+                        block = Block(
+                            cell=cell.dup(), depth=block.depth + 1, start=base + pos
+                        )
+                    else:
+                        raise self._error(base + pos, state)
+                elif ch == "]":
+                    if state == State.in_:
+                        if stack:
+                            child: Block = block
+                            child.end = base + pos + 1
+                            block, state = stack.pop()
+                            cell.column += 1
+                            child.init_text()
+                            if stack or self.keep:
+                                block.add_child(child)
+                            if not stack:
+                                completed.append(child)
+                        elif 0 < block.depth:
+                            self.done = True
+                            block.end = base + pos + 1
+                            break
+                        else:
+                            pass  # continue paring
+                    else:
+                        raise self._error(base + pos, state)
+                elif ch == "/":
+                    if state == State.new_line:
+                        # eat second "/"
+                        state = track(State.in_)
+                        transitions += 1
+                    else:
+                        state = track(State.new_line)
+                        transitions += 1
+                        # cell.row += 1
+                        cell.column = 0
+                else:  # "\n"
+                    # "/" instead of "//"
+                    if state == State.new_line:
+                        state = track(State.in_)
+                        transitions += 1
+                    else:
+                        if state != State.in_:
+                            raise self._error(base + pos, state)
+                        if stack or not head_only:
+                            block.add_span(chunk, pos, pos + 1, base)
+                        if log_lines:
+                            offset, line_no = base + pos, self.line_no
+                            logging.info(f"{offset = }, {line_no = }, {state = }")
+                        cell.row += 1
+                    self.line_no += 1
+                    self.line_start = base + pos + 1
+                pos += 1
+        finally:
+            self.offset = base + pos
+            self.state = state
+            self.block = block
+            self.head_only = head_only
+            sink: instrument.Sink = instrument.current()
+            if sink.counting:
+                sink.count("parse.bytes", pos - start)
+                sink.count("parse.blocks", blocks)
+                sink.count("parse.transitions", transitions)
+        return completed
+
+    def _error(self, offset: int, state: State) -> InvalidState:
+        """Return InvalidState at input OFFSET with its line and column"""
+
+        return InvalidState(
+            offset, state, line=self.line_no, column=offset - self.line_start + 1
+        )
+
+    def _track(self, state: State) -> State:
+        self.history.append(state)
+        return state
+
+    def close(self) -> Block:
+        """End the input, return the outermost Block
+
+        Unterminated blocks end with the input and are always attached
+        to their parents."""
+
+        # Unterminated blocks end with the buffer
+        while self.stack:
+            child: Block = self.block
+            child.end = self.offset
+            self.block, self.state = self.stack.pop()
+            self.cell.column += 1
+            self.block.add_child(child.init_text())
+            self.offset += 1
+        self.block.end = self.offset
+        return self.block.init_text()
 
 
 def parse_block(
     buffer: str,
     cursor: int = 0,
-    cell: Cell = Cell(0, 0),
+    cell: Optional[Cell] = None,
     state: State = State.void,
     depth: int = 0,
 ) -> tuple[Block, int]:
     """Parse block ([])
 
-    returns Block, input buffer offset, Cell (row, column pointer)"""
-    offset: int = cursor
-    block: Block = Block(cell=cell.dup(), depth=depth)
-    while offset < len(buffer):
-        ch: str = buffer[offset]
-        if ch == "[":
-            if state == State.void:
-                state = track_state(State.in_)
-            elif state == State.in_:
-                _block: Block
-                _block, offset = parse_block(
-                    buffer,
-                    offset + 1,
-                    cell,
-                    state=track_state(State.in_),
-                    depth=depth + 1,
-                )
-                cell.column += 1
-                block.children.append(_block.init_text())
-            else:
-                ParserState(buffer, offset, state).make_error()
-        elif ch == "]":
-            if state == State.in_:
-                if 0 < depth:
-                    return block, offset
-                else:
-                    pass  # continue paring
-            else:
-                ParserState(buffer, offset, state).make_error()
-        elif ch == "/":
-            if state == State.new_line:
-                # eat second "/"
-                state = track_state(State.in_)
-            else:
-                state = track_state(State.new_line)
-                # cell.row += 1
-                cell.column = 0
-        elif ch == "\n":
-            # "/" instead of "//"
-            if state == State.new_line:
-                state = track_state(State.in_)
-            else:
-                if state != State.in_:
-                    ParserState(buffer, offset, state).make_error()
-                block.append_ch(ch)
-                ParserState(buffer, offset, state).log_current_line()
-                cell.row += 1
-        else:
-            if state == State.in_:
-                block.append_ch(ch)
-            else:
-                ParserState(buffer, offset, state).make_error()
-        offset += 1
-    return block.init_text(), offset
-
-
-parser = argparse.ArgumentParser(
-    description="Parse .blk file",
-    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-)
-parser.add_argument(
-    "--pickle",
-    action="store_true",
-    help=" Pickle Block object in a file",
-)
+    returns Block, input buffer offset, Cell (row, column pointer)
+    CELL, Cell(0, 0) by default, is advanced past the block."""
+    block_parser = BlockParser(cell, state, depth, cursor)
+    block_parser.line_no += buffer.count("\n", 0, cursor)
+    block_parser.line_start = buffer.rfind("\n", 0, cursor) + 1
+    with instrument.current().span("parse"):
+        block_parser.feed(buffer, cursor)
+        if block_parser.done:
+            return block_parser.block, block_parser.offset
+        return block_parser.close(), block_parser.offset
+
+
+def parse_stream(
+    stream: TextIO,
+    chunk_size: int = 1 << 16,
+    block_parser: Optional[BlockParser] = None,
+) -> Block:
+    """Parse .blk text read from STREAM in chunks, with BLOCK_PARSER"""
+
+    if block_parser is None:
+        block_parser = BlockParser()
+    with instrument.current().span("parse"):
+        while chunk := stream.read(chunk_size):
+            block_parser.feed(chunk)
+        return block_parser.close()
+
+
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.WARN)
-    parser.add_argument("file_to_parse", choices=glob.glob("*.blk"))
-    argcomplete.autocomplete(parser)
-    args = parser.parse_args()
-    found_blk_files: list[str] = []
-    block: Block
-    with open(args.file_to_parse) as input:
-        buffer: str = input.read()
-        block = parse_block(buffer, 0, Cell(0, 0), track_state(State.void))[0]
-    if args.pickle:
-        pickle_filename = (
-            os.path.splitext(os.path.basename(args.file_to_parse))[0] + ".pickle"
-        )
-        with open(pickle_filename, "wb") as pickle_descriptor:
-            pickle.dump(block, pickle_descriptor)
-            print(f"Block saved in {pickle_filename}")
-    print(state_history)
-    print(block)
+    from cli import main
+
+    main(["scan", *sys.argv[1:]])
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import shutil
+from batch_svg import find_blk_files, convert_all
+
+
+def test_convert_all(tmp_path):
+    source = tmp_path / "blk"
+    source.mkdir()
+    for name in ("a", "b"):
+        shutil.copy("message.blk", source / f"{name}.blk")
+    (source / "bad.blk").write_text(" [red: x]")
+    blk_files = find_blk_files([str(source), str(source / "a.*")])
+    assert len(blk_files) == 3
+    failed = convert_all(blk_files, str(tmp_path / "svg"), jobs=2)
+    assert list(failed) == [str(source / "bad.blk")]
+    assert "InvalidState" in failed[str(source / "bad.blk")]
+    a_svg = (tmp_path / "svg" / "a.svg").read_text()
+    assert a_svg == (tmp_path / "svg" / "b.svg").read_text()
+    assert a_svg.endswith("</svg>")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import pytest
+import run_scan as RS
+import benchmark
+
+
+@pytest.mark.parametrize("shape", benchmark.shapes)
+def test_generate(shape):
+    source = benchmark.generate(shape, 50)
+    assert source == benchmark.generate(shape, 50)
+    assert source != benchmark.generate(shape, 50, seed=1)
+    block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+    blocks, stack = 0, [block]
+    while stack:
+        block = stack.pop()
+        blocks += 1
+        stack.extend(block.children)
+    assert 50 <= blocks
+
+
+def test_run_and_compare():
+    current = benchmark.run(["tall"], [30], repeat=1)
+    stages = [key.split("/")[2] for key in current["results"]]
+    assert stages == [
+        "parse",
+        "build_grid",
+        "compact_grid",
+        "align_rows",
+        "build_svg",
+        "compact_svg",
+    ]
+    assert all(0 < result["peak_bytes"] for result in current["results"].values())
+    baseline = {
+        "results": {
+            key: {**result, "seconds": result["seconds"] / 10}
+            for key, result in current["results"].items()
+        }
+    }
+    slower = {
+        "results": {
+            key: {**result, "seconds": max(result["seconds"], 1e-3)}
+            for key, result in current["results"].items()
+        }
+    }
+    lines = benchmark.compare(baseline, slower)
+    assert len(lines) == 6 and all(line.endswith("REGRESSION") for line in lines)
+    assert not any("REGRESSION" in line for line in benchmark.compare(slower, slower))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import zlib
+import struct
+import pytest
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+import build_png as BP
+
+source = (
+    "[#00CCDE: Window :center\n"
+    "[red: OK] [White: :nostroke] []\n"
+    "[goldenrod: wide :span]\n"
+    "[x: &<] [y:  ]\n"
+    "]\n"
+)
+
+
+def decode(png: bytes) -> tuple[int, int, list[bytes]]:
+    """Return width, height and pixel rows of PNG, checking its chunks"""
+
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks: dict[bytes, bytes] = {}
+    offset: int = 8
+    while offset < len(png):
+        (length,) = struct.unpack(">I", png[offset : offset + 4])
+        kind, data = png[offset + 4 : offset + 8], png[offset + 8 : offset + 8 + length]
+        (crc,) = struct.unpack(">I", png[offset + 8 + length : offset + 12 + length])
+        assert crc == zlib.crc32(kind + data)
+        chunks[kind] = data
+        offset += 12 + length
+    assert list(chunks) == [b"IHDR", b"IDAT", b"IEND"]
+    width, height, depth, color_type = struct.unpack(">IIBB", chunks[b"IHDR"][:10])
+    assert (depth, color_type) == (8, 2)
+    raw: bytes = zlib.decompress(chunks[b"IDAT"])
+    stride: int = 1 + 3 * width
+    rows = [raw[start : start + stride] for start in range(0, len(raw), stride)]
+    assert len(rows) == height and all(row[0] == 0 for row in rows)
+    return width, height, [row[1:] for row in rows]
+
+
+def pixel(rows: list[bytes], x: int, y: int) -> bytes:
+    return rows[y][3 * x : 3 * x + 3]
+
+
+def grid(text: str) -> RG.CompactGrid:
+    return RG.CompactGrid.from_block(RS.parse_block(text, 0, RS.Cell(0, 0))[0])
+
+
+def test_png(tmp_path):
+    (tmp_path / "window.blk").write_text(source)
+    BP.render_file(str(tmp_path / "window.blk"), str(tmp_path / "window.png"))
+    width, height, rows = decode((tmp_path / "window.png").read_bytes())
+    geometry = BS.Geometry.uniform(*BS.get_size(grid(source)))
+    assert (width, height) == (3 * geometry.size.x, 3 * geometry.size.y)
+
+    def cell(column, row, dx=2, dy=2):
+        x, y = geometry.start(column, row)
+        return pixel(rows, 3 * x + dx, 3 * y + dy)
+
+    assert pixel(rows, 0, 0) == BP.background
+    assert cell(0, 1) == b"\xff\x00\x00"
+    assert cell(0, 1, 0, 0) == cell(0, 1, -1, 15) == BP.text_color  # stroke
+    assert cell(1, 1) == cell(1, 1, 0, 0) == b"\xff\xff\xff"  # no stroke
+    assert cell(2, 1) == BP.background
+    assert cell(0, 2, 3 * BS.rect_width + 20) == b"\xda\xa5\x20"  # spans
+    assert cell(0, 3) == cell(1, 3, 50, 15) == BP.text_color  # unknown color
+    labels = rows[3 * geometry.ys[1] + 18]  # through the middle of "OK"
+    ok, white = (
+        {pixel([labels], 3 * x + dx, 0) for dx in range(3, 3 * BS.rect_width - 3)}
+        for x in geometry.xs[:2]
+    )
+    assert ok == {b"\xff\x00\x00", BP.text_color} and white == {b"\xff\xff\xff"}
+
+
+@pytest.mark.parametrize("scale", (1, 2, 3))
+def test_same_as_nodes(scale):
+    compact = grid(source)
+    nodes = RG.build_grid(RS.parse_block(source, 0, RS.Cell(0, 0))[0], [[]])[0]
+    image = BP.rasterize(compact, scale)
+    assert image.pixels == BP.rasterize(nodes, scale).pixels
+    assert decode(image.png())[2] == [bytes(image.row(y)) for y in range(image.height)]
+
+
+@pytest.mark.parametrize(
+    "color, rgb",
+    (
+        ("White", b"\xff\xff\xff"),
+        ("#00CCDE", b"\x00\xcc\xde"),
+        ("lightgray", b"\xd3\xd3\xd3"),
+        ("None", None),
+        ("x", b"\0\0\0"),
+    ),
+)
+def test_parse_color(color, rgb):
+    assert BP.parse_color(color) == rgb
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import io
+import os
+import sys
+import shutil
+import subprocess
+import pytest
+import cli
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_svg(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(here, "message.blk"), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    cli.main(["svg", "message.blk", "-o", "out.svg"])
+    cli.main(["scan", "message.blk", "--layout"])
+    cli.main(["svg", "message.layout", "-o", "layout.svg"])
+    assert (tmp_path / "out.svg").read_text() == (tmp_path / "layout.svg").read_text()
+
+
+@pytest.mark.parametrize(
+    "argv, message",
+    (
+        (["svg", "missing.blk"], "missing.blk: no such file"),
+        (["svg", "message.svg"], "message.svg: not a .blk or .layout file"),
+        (["grid", "message.blk"], "not a .pickle or .layout file"),
+        (["svg"], "blk_file is required without --watch"),
+        ([], "required: command"),
+    ),
+)
+def test_invalid_arguments(tmp_path, monkeypatch, capsys, argv, message):
+    (tmp_path / "message.svg").touch()
+    (tmp_path / "message.blk").touch()
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit):
+        cli.main(argv)
+    assert message in capsys.readouterr().err
+
+
+def test_lazy_imports():
+    code = (
+        "import sys, cli; cli.build_parser().parse_args(['scan', 'message.blk']);"
+        "modules = {'argcomplete', 'run_scan', 'numpy', 'pickle'};"
+        "print(sorted(modules & set(sys.modules)))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=here, capture_output=True, text=True
+    ).stdout
+    assert output.strip() == "[]"
+
+
+def test_stdin(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    with open(os.path.join(here, "message.blk")) as f:
+        source = f.read()
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(source.encode())))
+    cli.main(["svg", "-", "-o", "stdin.svg"])
+    cli.main(["svg", os.path.join(here, "message.blk"), "-o", "file.svg"])
+    assert (tmp_path / "stdin.svg").read_text() == (tmp_path / "file.svg").read_text()
+    capsys.readouterr()
+    monkeypatch.setattr(sys, "stdin", io.StringIO(source))
+    cli.main(["scan", "-", "--stream"])
+    frame, top = capsys.readouterr().out.splitlines()
+    assert frame.startswith('Block(Cell(1, 0), color="lightgray"')
+    assert top == 'Block(Cell(0, 0), color="#00CCDE", text="Messagebox Window ")'
+
+
+def test_stream_pipe():
+    # The first block is printed while the input is still open
+    process = subprocess.Popen(
+        [sys.executable, "cli.py", "scan", "-", "--stream"],
+        cwd=here,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    process.stdin.write("[top:\n[a: x]\n")
+    process.stdin.flush()
+    first = process.stdout.readline()
+    process.stdin.write("[b: y]]\n")
+    process.stdin.close()
+    assert first.startswith('Block(Cell(1, 0), color="a"')
+    assert process.stdout.read().startswith('Block(Cell(2, 1), color="b"')
+    assert process.wait() == 0
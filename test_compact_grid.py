@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import pytest
+import run_scan as RS
+import run_grid as RG
+
+sources = (
+    "message.blk",
+    "[a: top\n[b: x :nostroke] [] [c: y [d: z] [e: :center w]]\n/\n  [] [] [f: v]\n]",
+)
+
+
+@pytest.mark.parametrize("source", sources)
+def test_same_as_build_grid(source):
+    if source.endswith(".blk"):
+        with open(source) as f:
+            source = f.read()
+    block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+    grid = RG.build_grid(block, [[]], RS.Cell(0, 0))[0]
+    compact = RG.CompactGrid.from_block(block)
+    assert len(compact) == len(grid)
+    for compact_row, row in zip(compact, grid):
+        assert len(compact_row) == len(row)
+        assert compact_row == row
+        assert [compact_row[i] for i in range(-len(row), len(row))] == row + row
+    with pytest.raises(IndexError):
+        compact[len(grid)]
+
+
+def test_interned():
+    block = RS.parse_block("[a: x\n" + "[red: OK] [] " * 100 + "]", 0, RS.Cell(0, 0))[0]
+    compact = RG.CompactGrid.from_block(block)
+    assert compact.strings == ["", "a", "x", "red", "OK"]
+    assert len(compact.positions) == 201
+
+
+def test_padding():
+    block = RS.Block(
+        cell=RS.Cell(0, 0),
+        children=[RS.Block(cell=RS.Cell(0, 3)), RS.Block(cell=RS.Cell(2, 2))],
+    )
+    grid, last = RG.build_grid(block)
+    assert [[node.column for node in row] for row in grid] == [
+        [0, 3, 3, 3, 3],
+        [],
+        [2],
+    ]
+    assert last == RS.Cell(2, 5)
+    assert list(RG.CompactGrid.from_block(block)) == grid
+
+
+def test_deep():
+    depth = 10000
+    source = "[a: x " * depth + "]" * depth
+    block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+    grid, last = RG.build_grid(block)
+    assert [len(row) for row in grid] == [depth]
+    assert last == RS.Cell(0, depth - 1)
+    assert list(RG.CompactGrid.from_block(block)[0]) == grid[0]
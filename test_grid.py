@@ -2,9 +2,9 @@
 # -*- coding: utf-8 -*-
 # PYTHON_ARGCOMPLETE_OK
 """
+>>> block_parser = RS.BlockParser(history=100)
 >>> with open("message.blk") as f:
-...     buf = f.read()
-...     blk = RS.parse_block(buf, 0, RS.Cell(0, 0), RS.track_state(PS.State.void))[0]
+...     blk = RS.parse_stream(f, block_parser=block_parser)
 ...
 >>> with open("message.pickle", "wb") as p:
 ...     pickle.dump(blk, p)
@@ -15,8 +15,8 @@ Block(Cell(2, 1), color="White", text="Message text"), \
 Block(Cell(4, 0), color="goldenrod", text="OK Button"), \
 Block(Cell(4, 1)), Block(Cell(4, 2), color="#ff0505", text="Cancel Button"), \
 Block(Cell(5, 0))])])
->>> RS.state_history
-[<State.void: 1>, <State.in_: 2>, <State.in_: 2>, <State.in_: 2>, \
+>>> list(block_parser.history)
+[<State.in_: 2>, <State.in_: 2>, <State.in_: 2>, \
 <State.in_: 2>, <State.new_line: 4>, <State.in_: 2>, <State.in_: 2>, \
 <State.in_: 2>, <State.in_: 2>, <State.new_line: 4>, <State.in_: 2>, \
 <State.in_: 2>]
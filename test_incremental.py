@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import io
+import random
+import pytest
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+from incremental import IncrementalRender
+from parser_state import InvalidState
+
+
+def full_render(source: str) -> tuple[str, str]:
+    block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+    grid = RG.build_grid(block, [[]], RS.Cell(0, 0))[0]
+    svg = io.StringIO()
+    BS.write_svg(grid, svg)
+    return repr(block), svg.getvalue()
+
+
+def make_source(rng: random.Random) -> str:
+    lines = ["[#00CCDE: Window :center"]
+    for _ in range(rng.randint(1, 8)):
+        line = []
+        for _ in range(rng.randint(1, 4)):
+            if rng.random() < 0.3:
+                line.append("[]")
+            elif rng.random() < 0.2:
+                line.append("[gray: Group [red: a] [blue: b]]")
+            else:
+                line.append(f"[green: item {rng.randint(0, 99)}]")
+        lines.append(" ".join(line))
+        if rng.random() < 0.2:
+            lines.append("/" * rng.randint(1, 2))
+    return "\n".join(lines) + "\n]\n"
+
+
+edits = ("[], ", "[red: new] ", "\n", "x", "]", "[", "/", "//\n", "", "")
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_edits(seed):
+    rng = random.Random(seed)
+    source = make_source(rng)
+    render = IncrementalRender(source)
+    for _ in range(10):
+        start = rng.randrange(len(source))
+        end = min(len(source), start + rng.randint(0, 6))
+        edited = source[:start] + rng.choice(edits) + source[end:]
+        try:
+            expected_block, expected_svg = full_render(edited)
+        except InvalidState:
+            with pytest.raises(InvalidState):
+                render.update(edited)
+            continue
+        render.update(edited)
+        assert repr(render.root) == expected_block
+        assert render.svg() == expected_svg
+        source = edited
+
+
+def test_edit_leaves_other_blocks():
+    source = "[#00CCDE: Window\n" + "[green: a] [red: b [blue: c]]\n" * 50 + "]\n"
+    render = IncrementalRender(source)
+    children = list(render.root.children)
+    spans = [child._spans for child in children]
+    for edit in ("item", "x"):
+        at = source.index("a]", len(source) // 2)
+        source = source[:at] + edit + source[at:]
+        assert render.update(source) == range(25, 27)
+    kept = [(index, child) for index, child in enumerate(children) if index != 50]
+    assert all(render.root.children[index] is child for index, child in kept)
+    assert all(child._spans is spans[index] for index, child in kept)
+    starts = [render.block_start(index) for index in range(len(children))]
+    assert starts == [block.start for block in RS.parse_block(source)[0].children]
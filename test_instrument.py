@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import io
+import json
+import pstats
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+import instrument
+
+
+def render(source: str) -> None:
+    block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+    BS.build_svg(RG.CompactGrid.from_block(block), io.StringIO())
+
+
+def test_json_sink(tmp_path):
+    path = tmp_path / "report.json"
+    with instrument.use_sink(instrument.make_sink("json", str(path))):
+        render("[a: top\n[b: x] [c: y]\n[d: z]\n]")
+    report = json.loads(path.read_text())
+    assert [span["name"] for span in report["spans"]] == ["parse", "grid", "render"]
+    assert report["counters"] == {
+        "parse.bytes": 30,
+        "parse.blocks": 4,
+        "parse.transitions": 4,
+        "grid.cells": 4,
+        "grid.padded": 0,
+        "svg.elements": 2 + 2 * 6,
+    }
+
+
+def test_grid_padded():
+    sink = instrument.JsonSink()
+    with instrument.use_sink(sink):
+        RG.CompactGrid.from_block(RS.Block(cell=RS.Cell(0, 3)))
+    assert sink.counters == {"grid.cells": 1, "grid.padded": 3}
+
+
+def test_default_sink_is_silent():
+    assert not instrument.current().counting
+    render("[a: top [b: x]]")
+    sink = instrument.JsonSink()
+    with instrument.use_sink(sink):
+        assert instrument.current() is sink
+    assert not instrument.current().counting and sink.spans == []
+
+
+def test_cprofile_sink(tmp_path):
+    path = tmp_path / "report.pstats"
+    with instrument.use_sink(instrument.make_sink("cprofile", str(path))):
+        render("[a: top [b: x]]")
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert {"feed", "walk", "_build_svg"} <= functions
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import pytest
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+import layout_file as LF
+
+
+@pytest.fixture
+def layout(tmp_path):
+    with open("message.blk") as f:
+        block = RS.parse_stream(f)
+    grid = RG.CompactGrid.from_block(block)
+    path = str(tmp_path / "message.layout")
+    LF.save_layout(grid, path)
+    return grid, path
+
+
+def test_round_trip(layout):
+    grid, path = layout
+    with LF.load_layout(path) as mapped:
+        assert len(mapped) == len(grid)
+        assert all(a == b for a, b in zip(mapped, grid))
+        assert mapped[2][1].text == "Message text"
+        assert mapped[0][0].tags == (":center",)
+        assert mapped.aligned == grid.aligned == {0: 0, 1: 1}
+
+
+def test_render(layout, tmp_path):
+    path = layout[1]
+    BS.render_file("message.blk", str(tmp_path / "blk.svg"))
+    BS.render_file(path, str(tmp_path / "layout.svg"))
+    assert (tmp_path / "blk.svg").read_text() == (tmp_path / "layout.svg").read_text()
+
+
+@pytest.mark.parametrize(
+    "edit, message",
+    (
+        (lambda data: b"", "truncated"),
+        (lambda data: data[:-1], "truncated"),
+        (lambda data: b"XXXX" + data[4:], "not a layout"),
+        (lambda data: data[:4] + b"\x09\x00" + data[6:], "version 9"),
+    ),
+)
+def test_invalid(layout, tmp_path, edit, message):
+    with open(layout[1], "rb") as f:
+        data = f.read()
+    path = tmp_path / "invalid.layout"
+    path.write_bytes(edit(data))
+    with pytest.raises(LF.LayoutError, match=message):
+        LF.load_layout(str(path))
+
+
+def patch(data: bytes, offset: int, value: int) -> bytes:
+    return data[:offset] + value.to_bytes(4, "little") + data[offset + 4 :]
+
+
+def record(data: bytes, cell: int, field: int) -> int:
+    """Return the offset of FIELD of record CELL in the layout file DATA"""
+
+    rows = int.from_bytes(data[8:12], "little")
+    return LF.header.size + 4 * (rows + 1) + LF.record_size * cell + 4 * field
+
+
+@pytest.mark.parametrize(
+    "edit, message",
+    (
+        (lambda data: patch(data, record(data, 3, 4), 1 << 20), "string index"),
+        (lambda data: patch(data, record(data, 2, 3), 1 << 20), "string index"),
+        (lambda data: patch(data, record(data, 1, 6), 1 << 20), "tag bits"),
+        (lambda data: patch(data, record(data, 3, 1), 1 << 20), "position"),
+        (lambda data: patch(data, record(data, 3, 1), 0), "not sorted"),
+        (lambda data: patch(data, LF.header.size + 4, 1 << 20), "row table"),
+        (lambda data: patch(data, LF.header.size, 1), "row table"),
+    ),
+)
+def test_invalid_records(layout, tmp_path, edit, message):
+    with open(layout[1], "rb") as f:
+        data = f.read()
+    path = tmp_path / "invalid.layout"
+    path.write_bytes(edit(data))
+    with pytest.raises(LF.LayoutError, match=message):
+        LF.load_layout(str(path))
+
+
+def test_strings_are_lazy(layout):
+    with LF.load_layout(layout[1]) as mapped:
+        assert mapped.strings._decoded.count(None) == len(mapped.strings) - len(
+            RS.tag_registry.tags
+        )
+        assert mapped[2][1].text == "Message text"
+        assert list(mapped.strings) == layout[0].strings + [
+            tag for tag in RS.tag_registry.tags if tag not in layout[0].strings
+        ]
+        with pytest.raises(TypeError):
+            mapped.intern("x")
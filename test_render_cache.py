@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import os
+import run_scan as RS
+import build_svg as BS
+from render_cache import RenderCache
+
+
+def test_render_file(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    first, second = tmp_path / "first.svg", tmp_path / "second.svg"
+    BS.render_file("message.blk", str(first), cache)
+    assert len(os.listdir(cache.directory)) == 1
+    BS.render_file("message.blk", str(second), cache)
+    assert first.read_text() == second.read_text()
+    key = cache.key(b"", BS.render_settings())
+    assert key != cache.key(b"", {**BS.render_settings(), "font_size": 5})
+
+
+def test_tags_in_key(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path / "cache"))
+    settings = BS.render_settings()
+    registry = RS.TagRegistry()
+    for tag in RS.tag_registry.tags:
+        registry.register(tag, **RS.tag_registry.semantics[tag])
+    monkeypatch.setattr(RS, "tag_registry", registry)
+    assert BS.render_settings() == settings
+    registry.register(":bold", weight=700)
+    assert cache.key(b"", BS.render_settings()) != cache.key(b"", settings)
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=25)
+    source = tmp_path / "source.svg"
+    source.write_text("x" * 10)
+    for age, key in enumerate(("a", "b")):
+        cache.store(key, str(source))
+        os.utime(cache.path(key), (age, age))
+    assert cache.fetch("a", str(tmp_path / "a.svg"))  # "b" is older now
+    cache.store("c", str(source))
+    assert sorted(os.listdir(cache.directory)) == ["a.svg", "c.svg"]
+
+
+def test_replace_and_share(tmp_path):
+    directory = str(tmp_path / "cache")
+    source = tmp_path / "source.svg"
+    source.write_text("x" * 10)
+    cache = RenderCache(directory, max_bytes=25)
+    for _ in range(5):
+        cache.store("a", str(source))
+    assert cache._size == 10
+    other = RenderCache(directory, max_bytes=25)  # as in another process
+    other.store("b", str(source))
+    cache.store("c", str(source))
+    assert sum(entry.stat().st_size for entry in os.scandir(directory)) <= 25
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import asyncio
+import json
+import build_svg as BS
+from render_server import RenderServer, render_source, request
+
+
+def test_render_source(tmp_path):
+    BS.render_file("message.blk", str(tmp_path / "message.svg"))
+    with open("message.blk") as f:
+        assert render_source(f.read()) == (tmp_path / "message.svg").read_text()
+
+
+def test_serve(tmp_path):
+    path = str(tmp_path / "render.sock")
+    sources = [f"[red: item {i % 5}\n[blue: x] [] [g: y]]" for i in range(30)]
+    sources += ["[red: x]/ ", "[#00CCDE: Dialog :center\n[a: b]\n]"]
+
+    async def run():
+        server = RenderServer(workers=2, max_in_flight=4, cache_entries=3)
+        await server.start()
+        serving = asyncio.create_task(server.serve(path))
+        while not (tmp_path / "render.sock").exists():
+            await asyncio.sleep(0.01)
+        try:
+            responses = await request(path, sources)
+            again = await request(path, sources[-1:])
+        finally:
+            serving.cancel()
+            server.close()
+        return server, responses, again
+
+    server, responses, again = asyncio.run(run())
+    for source, response in zip(sources[:30], responses):
+        assert response["svg"] == render_source(source)
+    assert responses[30]["error"].startswith("InvalidState: cursor = 9:")
+    assert again == [{"id": 0, "svg": render_source(sources[-1])}]
+    assert 0 < server.hits and len(server.cache) == 3 and not server.pending
+
+
+def test_long_request(tmp_path):
+    path = str(tmp_path / "render.sock")
+
+    async def run():
+        server = RenderServer(workers=1, limit=64)
+        await server.start()
+        serving = asyncio.create_task(server.serve(path))
+        while not (tmp_path / "render.sock").exists():
+            await asyncio.sleep(0.01)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            long_line = json.dumps({"id": 0, "blk": "[red: " + "x" * 1000 + "]"})
+            # The server is over the limit before the end of the line comes
+            writer.write(long_line[:500].encode())
+            await writer.drain()
+            await asyncio.sleep(0.05)
+            writer.write(long_line[500:].encode() + b"\n")
+            writer.write(json.dumps({"id": 1, "blk": "[red: x]"}).encode() + b"\n")
+            writer.write_eof()
+            responses = [json.loads(line) async for line in reader]
+            writer.close()
+        finally:
+            serving.cancel()
+            server.close()
+        return responses
+
+    assert asyncio.run(run()) == [
+        {"id": None, "error": "request longer than 64 bytes"},
+        {"id": 1, "svg": render_source("[red: x]")},
+    ]
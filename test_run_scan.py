@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import run_scan as RS
+import run_grid as RG
+from parser_state import InvalidState
+
+
+def test_message():
+    with open("message.blk") as f:
+        block = RS.parse_block(f.read(), 0, RS.Cell(0, 0))[0]
+    frame = block.children[0]
+    assert (block.color, block.text) == ("#00CCDE", "Messagebox Window ")
+    assert [(b.cell.row, b.cell.column, b.text) for b in frame.children] == [
+        (2, 0, ""),
+        (2, 1, "Message text"),
+        (4, 0, "OK Button"),
+        (4, 1, ""),
+        (4, 2, "Cancel Button"),
+        (5, 0, ""),
+    ]
+
+
+def test_deep_nesting():
+    depth = sys.getrecursionlimit() * 2
+    buffer = "[red: top " + "[blue: x " * depth + "]" * depth + "]"
+    block = RS.parse_block(buffer, 0, RS.Cell(0, 0))[0]
+    for _ in range(depth):
+        (block,) = block.children
+    assert (block.color, block.text, block.depth) == ("blue", "x ", depth)
+
+
+@pytest.mark.parametrize(
+    "buffer, cursor",
+    (
+        (" [red: x]", 0),
+        ("[red: x]/ ", 9),
+        ("[red: x /[]]", 9),
+        ("]", 0),
+    ),
+)
+def test_invalid_state(buffer, cursor):
+    with pytest.raises(InvalidState, match=f"cursor = {cursor}:"):
+        RS.parse_block(buffer, 0, RS.Cell(0, 0))
+
+
+@pytest.mark.parametrize("chunk_size", (1, 3, 100))
+def test_invalid_state_line(chunk_size):
+    buffer = "[red: x\n[blue: y]\n  / ]"
+    block_parser = RS.BlockParser()
+    with pytest.raises(InvalidState) as info:
+        for start in range(0, len(buffer), chunk_size):
+            block_parser.feed(buffer[start : start + chunk_size])
+    assert (info.value.cursor, info.value.line, info.value.column) == (21, 3, 4)
+    assert str(info.value).endswith("line = 3, column = 4")
+    with pytest.raises(InvalidState) as info:
+        RS.parse_block("a\n [b]", 2)
+    assert (info.value.line, info.value.column) == (2, 1)
+
+
+def test_feed_chunks():
+    with open("message.blk") as f:
+        buffer = f.read()
+    block_parser = RS.BlockParser(keep=False)
+    completed = []
+    for ch in buffer:
+        completed += block_parser.feed(ch)
+    block = block_parser.close()
+    assert [b.text for b in completed] == ["Frame  "]
+    assert block.text == "Messagebox Window " and block.children == []
+    expected = RS.parse_block(buffer, 0, RS.Cell(0, 0))[0].children
+    assert repr(expected) == repr(completed)
+
+
+def test_feed_without_keep_is_bounded():
+    block_parser = RS.BlockParser(keep=False)
+    block_parser.feed("[red: top\n")
+    for _ in range(1000):
+        assert len(block_parser.feed("[a: x [b: y]]  \n /\n")) == 1
+    block = block_parser.close()
+    assert block.body_str == "red: top\n" and block_parser.body_marks == []
+
+
+def test_history_is_bounded():
+    block_parser = RS.BlockParser(history=3)
+    block_parser.feed("[a: x [b: y]\n[c: z] /\n]")
+    assert list(block_parser.history) == [
+        RS.State.in_,
+        RS.State.new_line,
+        RS.State.in_,
+    ]
+    assert RS.BlockParser().history.maxlen == 0
+
+
+def test_defaults_do_not_leak():
+    first = RS.parse_block("[a: x\n[b: y]]")[0]
+    second = RS.parse_block("[a: x\n[b: y]]")[0]
+    assert repr(first) == repr(second)
+    assert RG.build_grid(first)[0] == RG.build_grid(second)[0]
+
+
+def test_threads():
+    sources = [f"[a: x\n{'[b: y] ' * n}\n/\n[c: z]]" for n in range(1, 40)]
+    expected = [repr(RS.parse_block(source)[0]) for source in sources]
+    with ThreadPoolExecutor(8) as executor:
+        for _ in range(5):
+            blocks = executor.map(lambda source: RS.parse_block(source)[0], sources)
+            assert [repr(block) for block in blocks] == expected
+
+
+def test_tag_registry():
+    registry = RS.TagRegistry()
+    assert registry.extract("a :b") == ("a :b", ())
+    assert registry.register(":b") == 0
+    assert registry.register(":bold", weight=700) == 1
+    assert registry.register(":b", short=True) == 0
+    assert registry.semantics == {":b": {"short": True}, ":bold": {"weight": 700}}
+    assert registry.masks == {"short": 1, "weight": 2}
+    text, tags = registry.extract(":bolder a :b:bold")
+    assert (text, tags) == ("er a ", (":b", ":bold"))
+    assert tags is registry.extract(":bold :b")[1]
+    assert registry.tag_masks[tags] == 3
+    assert registry.parse(" red: x:b y\n:bold") == ("red", "x y", (":b",))
+    assert registry.parse("[red: x]", 1, 7) == ("red", "x", ())
+    assert registry.parse("red:\n[a: x]") is None
+    for tag in ("b", ":", ":a b"):
+        with pytest.raises(ValueError):
+            registry.register(tag)
+
+
+def test_builtin_tags():
+    registry = RS.tag_registry
+    assert registry.tags[: len(RS.known_tags)] == RS.known_tags
+    assert registry.masks["nostroke"] == 1
+    assert registry.masks["place"] == 0b11110
+    block = RS.parse_block("[red: OK :span :nostroke]", 0, RS.Cell(0, 0))[0]
+    assert (block.text, block.tags) == ("OK  ", (":nostroke", ":span"))
+    assert RG.alignment(block.tags, 3) == RG.Alignment(0, 3)
+
+
+def test_chunked_parse_is_linear():
+    def parse_time(lines):
+        source = "[red: " + "word\n" * lines + "[a: x]]"
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            block = RS.parse_stream(io.StringIO(source), chunk_size=64)
+            best = min(best, time.perf_counter() - start)
+        assert len(block.body_str) == 5 + 5 * lines and len(block.children) == 1
+        return best
+
+    # A body over many chunks, 8 times longer: quadratic parsing takes 64
+    # times longer
+    assert parse_time(160000) < 16 * parse_time(20000)
@@ -3,7 +3,7 @@
 # PYTHON_ARGCOMPLETE_OK
 import pytest
 from build_svg import _get1_x, _get1_y, _get2_x, _get2_y
-from build_svg import Point, rect_start, rect_end
+from build_svg import Point, rect_start, rect_end, colrow_xy, Geometry
 
 xy_table = (
     (0, 0, (1, 1), (38, 12)),
@@ -41,3 +41,20 @@ def test_get_xy(row, col, x1_y1, x2_y2):
 def test_rect(row, col, xy1, xy2):
     assert rect_start(col, row) == Point(*xy1)
     assert rect_end(col, row) == Point(*xy2)
+
+
+@pytest.mark.parametrize(
+    "row, col, xy1, xy2", xy_table, ids=[f"row{r}_col{c}" for r, c, *_ in xy_table]
+)
+def test_geometry(row, col, xy1, xy2):
+    geometry = Geometry.uniform(3, 6)
+    assert geometry.start(col, row) == colrow_xy(col, row) == Point(*xy1)
+    assert geometry.end(col, row) == Point(*xy2)
+    assert geometry.size == (114, 72)
+
+
+def test_geometry_variable():
+    geometry = Geometry([10, 20, 30], [5, 15])
+    assert [geometry.start(col, 1) for col in range(3)] == [(1, 8), (13, 8), (35, 8)]
+    assert geometry.end(2, 1) == (66, 24)
+    assert geometry.size == (66, 24)
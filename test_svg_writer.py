@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import io
+import gzip
+import xml.etree.ElementTree as ET
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+from build_svg import build_svg
+
+
+def make_grid(buffer: str) -> RG.GridType:
+    block = RS.parse_block(buffer, 0, RS.Cell(0, 0))[0]
+    return RG.build_grid(block, [[]], RS.Cell(0, 0))[0]
+
+
+def assert_same_output(buffer: str) -> None:
+    tree = ET.tostring(build_svg(make_grid(buffer)), encoding="unicode")
+    stream = io.StringIO()
+    assert build_svg(make_grid(buffer), stream=stream) is None
+    assert stream.getvalue() == tree
+
+
+def test_message():
+    with open("message.blk") as f:
+        assert_same_output(f.read())
+
+
+def test_escaping():
+    assert_same_output(
+        '[#00CCDE: <Top> & "bottom" :center\n'
+        "    [red: a\tb > c] [] [blue: &amp;]\n"
+        "    /\n"
+        "    [green: 'quoted'] [x_1: éè]\n"
+        "]\n"
+    )
+
+
+def test_alignment():
+    grid = make_grid(
+        "[a: top\n[b: x] [c: y] [d: z]\n/\n[e: :left] [f: g :right]\n/\n[h: i :span]\n]"
+    )
+    geometry = BS.Geometry.uniform(3, 4)
+    rects = list(BS.layout_cells(grid, geometry, 3, 4))
+    cells = [
+        (rect.fill, rect.x, rect.width) for rect in rects if rect.fill != "lightgray"
+    ]
+    assert cells == [
+        ("a", 1, 36),
+        ("b", 1, 36),
+        ("c", 39, 36),
+        ("d", 77, 36),
+        ("e", 1, 36),
+        ("h", 1, 112),
+    ]
+    assert len(rects) == 3 * 4 - 2
+    assert_same_output("[a: top\n[b: x :right] [c: y :span]\n/\n[d: z :span]\n]")
+
+
+def test_grid_unchanged():
+    grid = make_grid("[a: :center\n[: x] [] [b: y :right]\n]")
+    before = repr(grid)
+    first = ET.tostring(build_svg(grid), encoding="unicode")
+    assert ET.tostring(build_svg(grid), encoding="unicode") == first
+    assert repr(grid) == before
+
+
+def drawn(svg: str) -> tuple[set, list]:
+    """Visible rectangles and texts of SVG markup"""
+
+    ns = "{http://www.w3.org/2000/svg}"
+    root = ET.fromstring(svg)
+    shapes = {shape.get("id"): shape for shape in root.iter(ns + "rect")}
+    rects = set()
+    for rect in root.iter():
+        if rect.tag == ns + "use":
+            href = rect.get("{http://www.w3.org/1999/xlink}href")
+            attrib = {**shapes[href[1:]].attrib, **rect.attrib}
+        elif rect.tag == ns + "rect" and "id" not in rect.attrib:
+            attrib = rect.attrib
+        else:
+            continue
+        fill, stroke = attrib["fill"], attrib.get("stroke", "None")
+        if fill != "lightgray" or stroke != "None":
+            rects.add((attrib["x"], attrib["y"], attrib["width"], fill, stroke))
+    texts = [
+        (text.get("x"), text.get("y"), text.text)
+        for text in root.iter(ns + "text")
+        if text.text
+    ]
+    return rects, texts
+
+
+def test_optimized():
+    with open("message.blk") as f:
+        sources = [f.read(), "[a: :span\n[b: <x> :right] [c: y]\n/\n[: z] [d:]\n]"]
+    for source in sources:
+        grid = make_grid(source)
+        block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+        svg = io.StringIO()
+        build_svg(grid, svg)
+        for optimized_grid in (grid, RG.CompactGrid.from_block(block)):
+            optimized = io.StringIO()
+            build_svg(optimized_grid, optimized, optimize=True)
+            assert drawn(optimized.getvalue()) == drawn(svg.getvalue())
+            assert len(optimized.getvalue()) < len(svg.getvalue())
+
+
+def test_svgz(tmp_path):
+    BS.render_file("message.blk", str(tmp_path / "a.svg"), optimize=True)
+    BS.render_file("message.blk", str(tmp_path / "a.svgz"), optimize=True)
+    BS.render_file("message.blk", str(tmp_path / "b.svgz"), optimize=True)
+    compressed = (tmp_path / "a.svgz").read_bytes()
+    assert gzip.decompress(compressed) == (tmp_path / "a.svg").read_bytes()
+    assert compressed == (tmp_path / "b.svgz").read_bytes()
+
+
+def test_auto_width():
+    source = (
+        "[#00CCDE: Messagebox Window :center\n"
+        "[red: a] [b: a rather longer label] [c: c]\n"
+        "[d: the longest label of all, spanning all three columns of this grid"
+        " at once :span]\n"
+        "]\n"
+    )
+    block = RS.parse_block(source, 0, RS.Cell(0, 0))[0]
+    grid = make_grid(source)
+    tree = ET.tostring(build_svg(grid, auto_width=True), encoding="unicode")
+    for any_grid in (grid, RG.CompactGrid.from_block(block)):
+        stream = io.StringIO()
+        build_svg(any_grid, stream, auto_width=True)
+        assert stream.getvalue() == tree
+    root = ET.fromstring(tree)
+    rects = root.findall("{http://www.w3.org/2000/svg}rect")[1:]
+    texts = root.findall("{http://www.w3.org/2000/svg}text")
+    for rect, text in zip(rects, texts):
+        assert BS.label_width(text.text or "") <= int(rect.get("width"))
+    widths = BS.node_widths(grid, 3, BS.align_rows(grid, 3))
+    assert widths[0] == widths[2] < widths[1]
+    assert int(rects[-1].get("width")) - BS.label_width(texts[-1].text) < 3
+    assert root.get("viewBox") == f"0 0 {sum(widths) + 6} 36"
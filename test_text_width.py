@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import pytest
+from text_width import advances, text_width
+
+
+def test_fonts():
+    assert all(len(table) == 126 - 31 for table in advances.values())
+    assert text_width("Window", 10, "monospace") == 36
+    assert text_width("il", 4) < text_width("WM", 4)
+    assert text_width("WM", 4, "sans-serif") != text_width("WM", 4)
+    assert text_width("", 4) == 0
+    with pytest.raises(KeyError):
+        text_width("a", 4, "fantasy")
+
+
+def test_not_ascii():
+    assert text_width("e\u0301", 10) == text_width("e", 10)  # combining accent
+    assert text_width("\u00e9", 10) == text_width("n", 10)
+    assert text_width("漢字", 10) == 20
+
+
+def test_memoized():
+    text_width.cache_clear()
+    for _ in range(3):
+        text_width("OK Button", 4)
+    text_width("OK Button", 5)
+    info = text_width.cache_info()
+    assert (info.hits, info.misses) == (2, 2)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import gzip
+import json
+import xml.etree.ElementTree as ET
+import pytest
+import build_svg as BS
+from tile_svg import render_tiles
+
+ns = "{http://www.w3.org/2000/svg}"
+source = (
+    "[#00CCDE: Window :center\n"
+    "[a: 1] [b: 2] [c: 3] [d: 4] [e: 5]\n"
+    "[f: wide :span]\n"
+    "[g: 6 :right] [h: 7]\n"
+    "[i: 8] [] [j: 9]\n"
+    "]\n"
+)
+
+
+def elements(svg: bytes) -> set[tuple[str, ...]]:
+    return {
+        (element.tag, *sorted(element.attrib.items()), element.text or "")
+        for element in ET.fromstring(svg)
+        if element.tag in (ns + "rect", ns + "text") and "px" not in element.get("x")
+    }
+
+
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_same_as_svg(tmp_path, jobs):
+    blk_file = tmp_path / "window.blk"
+    blk_file.write_text(source)
+    BS.render_file(str(blk_file), str(tmp_path / "whole.svg"))
+    manifest = render_tiles(str(blk_file), str(tmp_path / "tiles"), 2, 2, jobs)
+    assert len(manifest["tiles"]) == 3 * 3
+    tiled: set[tuple[str, ...]] = set()
+    area: int = 0
+    for tile in manifest["tiles"]:
+        svg = (tmp_path / "tiles" / tile["file"]).read_bytes()
+        x, y, width, height = (tile[key] for key in ("x", "y", "width", "height"))
+        assert ET.fromstring(svg).get("viewBox") == f"{x} {y} {width} {height}"
+        tiled |= elements(svg)
+        area += width * height
+    assert tiled == elements((tmp_path / "whole.svg").read_bytes())
+    assert area == manifest["width"] * manifest["height"]
+    assert json.loads((tmp_path / "tiles" / "window.json").read_text()) == manifest
+    index = ET.parse(tmp_path / "tiles" / "window.svg").getroot()
+    assert len(index.findall(ns + "image")) == 3 * 3
+
+
+def test_svgz(tmp_path):
+    BS.render_file("message.blk", str(tmp_path / "whole.svg"))
+    manifest = render_tiles("message.blk", str(tmp_path), suffix=".svgz")
+    (tile,) = manifest["tiles"]
+    assert tile["file"] == "message_0_0.svgz"
+    svg = gzip.decompress((tmp_path / tile["file"]).read_bytes())
+    assert elements(svg) == elements((tmp_path / "whole.svg").read_bytes())
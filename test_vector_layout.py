@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import io
+import random
+import pytest
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+import vector_layout as VL
+
+
+def make_source(rng: random.Random) -> str:
+    items = (
+        "[]",
+        "[red: a :center]",
+        "[blue: :nostroke b]",
+        "[x: &<]",
+        "[y:  ]",
+        "[l: :left]",
+        "[r: c :right :nostroke]",
+        "[s: wide :span]",
+    )
+    lines = ["[#00CCDE: Window"]
+    for _ in range(rng.randint(1, 10)):
+        lines.append(" ".join(rng.choices(items, k=rng.randint(0, 6))))
+        if rng.random() < 0.3:
+            lines.append("[gray: Group [red: a] [green: b :center]]")
+    return "\n".join(lines) + "\n]\n"
+
+
+def node_svg(block: RS.Block) -> str:
+    """SVG of BLOCK laid out Node by Node"""
+
+    grid = RG.build_grid(block, [[]], RS.Cell(0, 0))[0]
+    columns, rows = BS.get_size(grid)
+    geometry = BS.Geometry.uniform(columns, rows)
+    svg = io.StringIO()
+    rects = BS.layout_cells(grid, geometry, columns, rows)
+    BS.stream_svg(svg, rects, *geometry.size)
+    return svg.getvalue()
+
+
+@pytest.mark.parametrize("numpy", (True, False))
+@pytest.mark.parametrize("seed", range(20))
+def test_same_as_layout_cells(monkeypatch, numpy, seed):
+    if numpy:
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(VL, "numpy_cells", 0)
+    else:
+        monkeypatch.setattr(VL, "use_numpy", False)
+    block = RS.parse_block(make_source(random.Random(seed)), 0, RS.Cell(0, 0))[0]
+    svg = io.StringIO()
+    BS.build_svg(RG.CompactGrid.from_block(block), svg)
+    assert svg.getvalue() == node_svg(block)
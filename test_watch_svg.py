@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# PYTHON_ARGCOMPLETE_OK
+import os
+import shutil
+from watch_svg import Watcher
+
+
+def test_debounce(tmp_path):
+    blk_file = str(tmp_path / "message.blk")
+    shutil.copy("message.blk", blk_file)
+    watcher = Watcher(str(tmp_path), debounce=1.0)
+    assert watcher.poll(0.0) == []
+    assert watcher.poll(0.5) == []
+    assert watcher.poll(1.0) == [blk_file]
+    watcher.build(blk_file)
+    assert "Cancel Button" in (tmp_path / "message.svg").read_text()
+    assert watcher.poll(2.0) == []
+
+    with open(blk_file, "a") as f:
+        f.write("\n")
+    os.utime(blk_file, ns=(0, 1))
+    assert watcher.poll(3.0) == []
+    os.utime(blk_file, ns=(0, 2))  # saved again, wait from here
+    assert watcher.poll(3.5) == []
+    assert watcher.poll(4.0) == []
+    assert watcher.poll(4.5) == [blk_file]
+
+
+def test_removed(tmp_path):
+    shutil.copy("message.blk", tmp_path / "message.blk")
+    watcher = Watcher(str(tmp_path), debounce=0.0)
+    assert len(watcher.poll(0.0)) == 0 and len(watcher.poll(0.0)) == 1
+    os.remove(tmp_path / "message.blk")
+    assert watcher.poll(1.0) == [] and watcher.built == {}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Width of label text, from the glyph advances of a font
+
+Advances are those of the standard PostScript fonts, in thousandths of
+the font size, for printable ASCII. Other characters are as wide as "n",
+East Asian wide ones a full em, combining marks nothing. The SVG sets no
+font-family, so renderers draw labels in their default, serif, font.
+Labels repeat across cells and diagrams, so widths are memoized."""
+
+from functools import lru_cache
+from unicodedata import combining, east_asian_width
+
+# Advance of every printable ASCII character, from the space to "~"
+advances: dict[str, tuple[int, ...]] = {
+    "serif": (  # Times-Roman
+        *(250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333),
+        *(250, 278, 500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278),
+        *(564, 564, 564, 444, 921, 722, 667, 667, 722, 611, 556, 722, 722, 333),
+        *(389, 722, 611, 889, 722, 722, 556, 722, 667, 556, 611, 722, 722, 944),
+        *(722, 722, 611, 333, 278, 333, 469, 500, 333, 444, 500, 444, 500, 444),
+        *(333, 500, 500, 278, 278, 500, 278, 778, 500, 500, 500, 500, 333, 389),
+        *(278, 500, 500, 722, 500, 500, 444, 480, 200, 480, 541),
+    ),
+    "sans-serif": (  # Helvetica
+        *(278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333),
+        *(278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278),
+        *(584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278),
+        *(500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944),
+        *(667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556, 500, 556, 556),
+        *(278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500),
+        *(278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584),
+    ),
+    "monospace": (600,) * 95,  # Courier
+}
+default_font: str = "serif"
+
+# Advances of every font by character code, control characters included
+_tables: dict[str, tuple[int, ...]] = {
+    font: (0,) * 32 + table + (0,) for font, table in advances.items()
+}
+
+
+@lru_cache(maxsize=1 << 16)
+def text_width(text: str, size: float, font: str = default_font) -> float:
+    """Return width of TEXT drawn at font SIZE in FONT, in units of SIZE"""
+
+    table: tuple[int, ...] = _tables[font]
+    if text.isascii():
+        return sum(map(table.__getitem__, text.encode())) * size / 1000
+    total: int = 0
+    for char in text:
+        code: int = ord(char)
+        if code < 128:
+            total += table[code]
+        elif combining(char):
+            continue
+        elif east_asian_width(char) in ("W", "F"):
+            total += 1000
+        else:
+            total += table[ord("n")]
+    return total * size / 1000
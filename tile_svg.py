@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Render a large grid as SVG tiles in parallel, with an index
+
+The grid is compiled once to a layout file, which every worker process
+maps, and each tile of `tile_rows' by `tile_columns' cells is rendered
+by a worker. A tile keeps the coordinates of the whole drawing: its
+view box starts where the tile is, so `<stem>.svg' shows all of them
+with one <image> each, and a viewer can read `<stem>.json' to load only
+the tiles in view."""
+
+from __future__ import annotations
+from typing import Any, Optional, TextIO
+from concurrent.futures import ProcessPoolExecutor
+import os
+import json
+import tempfile
+import run_scan as RS
+import run_grid as RG
+import build_svg as BS
+from layout_file import MappedGrid, load_layout, save_layout
+
+# svg_file, tile rows, tile columns, places, optimize
+TileJob = tuple[str, range, range, dict[int, BS.Place], bool]
+
+# Grid, its columns and geometry in a worker, see open_grid()
+_grid: Optional[MappedGrid] = None
+_columns: int = 0
+_geometry: Optional[BS.Geometry] = None
+
+
+def tile_box(
+    geometry: BS.Geometry, rows: range, columns: range
+) -> tuple[int, int, int, int]:
+    """Return x, y, width, height of the cells of ROWS and COLUMNS
+
+    Tiles side by side cover the drawing without gaps or overlaps."""
+
+    v: int = geometry.stroke
+    x: int = geometry.xs[columns.start] - v
+    y: int = geometry.ys[rows.start] - v
+    width: int = geometry.xs[columns.stop] - geometry.xs[columns.start]
+    height: int = geometry.ys[rows.stop] - geometry.ys[rows.start]
+    return x, y, width, height
+
+
+def open_grid(layout: str, columns: int, rows: int) -> None:
+    """Map LAYOUT, a grid of COLUMNS and ROWS, for the tiles to come
+
+    Loading the strings of a large layout takes a while, so a worker
+    does it once."""
+
+    global _grid, _columns, _geometry
+    close_grid()
+    _grid = load_layout(layout)
+    _columns, _geometry = columns, BS.Geometry.uniform(columns, rows)
+
+
+def close_grid() -> None:
+    global _grid
+    if _grid is not None:
+        _grid.close()
+        _grid = None
+
+
+def render_tile(job: TileJob) -> None:
+    """Write the SVG of one tile of the grid of open_grid()"""
+
+    svg_file, tile_rows, tile_columns, places, optimize = job
+    grid, columns, geometry = _grid, _columns, _geometry
+    assert grid is not None and geometry is not None
+    x, y, width, height = tile_box(geometry, tile_rows, tile_columns)
+    rects = (
+        rect
+        for row in tile_rows
+        for rect in BS.layout_row(
+            grid[row], row, geometry, columns, places.get(row), tile_columns
+        )
+    )
+    with BS.open_svg(svg_file) as f:
+        f.write(BS.svg_header)
+        if optimize:
+            BS.optimized_svg(f, rects, width, height, 3, (x, y))
+        else:
+            BS.stream_svg(f, rects, width, height, 3, (x, y))
+
+
+def write_index(
+    stream: TextIO, tiles: list[dict[str, Any]], view_width: int, view_height: int
+) -> None:
+    """Write SVG showing TILES, an <image> each, to STREAM"""
+
+    svg_attrib, background_attrib = BS._root_attributes(view_width, view_height, 3)
+    stream.write(BS.svg_header)
+    stream.write(BS._start_tag("svg", svg_attrib) + ">")
+    stream.write(BS._start_tag("rect", background_attrib) + " />")
+    for tile in tiles:
+        attrib: dict[str, str] = {
+            "x": str(tile["x"]),
+            "y": str(tile["y"]),
+            "width": str(tile["width"]),
+            "height": str(tile["height"]),
+            "xlink:href": tile["file"],
+        }
+        stream.write(BS._start_tag("image", attrib) + " />")
+    stream.write("</svg>")
+
+
+def render_tiles(
+    blk_file: str,
+    output_dir: str,
+    tile_rows: int = 256,
+    tile_columns: int = 64,
+    jobs: Optional[int] = None,
+    optimize: bool = False,
+    suffix: str = ".svg",
+) -> dict[str, Any]:
+    """Render BLK_FILE (.blk or .layout) as tiles into OUTPUT_DIR
+
+    Tiles are rendered by JOBS processes, `<stem>_<row>_<column>SUFFIX'
+    where row and column count tiles; a .svgz SUFFIX compresses them.
+    Write the index `<stem>.svg' and the manifest `<stem>.json', and
+    return the manifest."""
+
+    stem: str = os.path.splitext(os.path.basename(blk_file))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as directory:
+        layout: str = blk_file
+        if not blk_file.endswith(".layout"):
+            with open(blk_file) as f:
+                grid = RG.CompactGrid.from_block(RS.parse_stream(f))
+            layout = os.path.join(directory, stem + ".layout")
+            save_layout(grid, layout)
+        with load_layout(layout) as mapped:
+            columns, rows = BS.get_size(mapped)
+            places: dict[int, BS.Place] = BS.align_rows(mapped, columns)
+        geometry = BS.Geometry.uniform(columns, rows)
+        todo: list[TileJob] = []
+        tiles: list[dict[str, Any]] = []
+        for first_row in range(0, rows, tile_rows):
+            row_range = range(first_row, min(first_row + tile_rows, rows))
+            for first_column in range(0, max(columns, 1), tile_columns):
+                column_range = range(
+                    first_column, min(first_column + tile_columns, columns)
+                )
+                row, column = first_row // tile_rows, first_column // tile_columns
+                name: str = f"{stem}_{row}_{column}{suffix}"
+                x, y, width, height = tile_box(geometry, row_range, column_range)
+                tiles.append(
+                    {
+                        "file": name,
+                        "row": row,
+                        "column": column,
+                        "x": x,
+                        "y": y,
+                        "width": width,
+                        "height": height,
+                    }
+                )
+                tile_places: dict[int, BS.Place] = {
+                    index: places[index] for index in row_range if index in places
+                }
+                todo.append(
+                    (
+                        os.path.join(output_dir, name),
+                        row_range,
+                        column_range,
+                        tile_places,
+                        optimize,
+                    )
+                )
+        if jobs == 1:
+            open_grid(layout, columns, rows)
+            try:
+                for job in todo:
+                    render_tile(job)
+            finally:
+                close_grid()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=open_grid,
+                initargs=(layout, columns, rows),
+            ) as executor:
+                list(executor.map(render_tile, todo))
+    view_width, view_height = geometry.size
+    manifest: dict[str, Any] = {
+        "width": view_width,
+        "height": view_height,
+        "factor": 3,
+        "tile_rows": tile_rows,
+        "tile_columns": tile_columns,
+        "tiles": tiles,
+    }
+    with open(os.path.join(output_dir, stem + ".svg"), "w", encoding="utf-8") as f:
+        write_index(f, tiles, view_width, view_height)
+    with open(os.path.join(output_dir, stem + ".json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Fill, text and stroke of every cell of a CompactGrid at once
+
+The cells are laid out the way build_svg.layout_cells() does, aligned
+rows included, but straight from the arrays of the grid instead of
+Node by Node. NumPy is used for grids of `numpy_cells' cells or more
+when it is installed, otherwise the same table is computed in pure
+Python. NumPy is imported by the first grid that large, as importing
+it takes longer than laying out a small grid."""
+
+from typing import Any, Iterable, NamedTuple, Optional
+import run_grid as RG
+from run_scan import tag_registry
+
+numpy_cells: int = 4096
+# Use NumPy, None until it is known whether it is installed
+use_numpy: Optional[bool] = None
+np: Any = None
+
+
+class CellTable(NamedTuple):
+    """Cells of a grid row by row, `columns' cells in every row
+
+    `fills' and `texts' index `strings', the strings of the grid, with
+    the empty fill meaning lightgray. A cell is drawn without stroke
+    where `strokes' is false. The cell of a row in `spans' is drawn
+    that many columns wide, from its offset."""
+
+    columns: int
+    rows: int
+    fills: list[int]
+    texts: list[int]
+    strokes: list[bool]
+    strings: list[str]
+    spans: dict[int, RG.Alignment]
+
+
+def _blank(strings: list[str]) -> list[bool]:
+    return [not string.strip() for string in strings]
+
+
+def _places(grid: RG.CompactGrid, columns: int) -> dict[int, tuple[int, RG.Alignment]]:
+    """Return the cell drawn in every aligned row and its place"""
+
+    tags, mask_tags = grid.tags, tag_registry.mask_tags
+    places: dict[int, tuple[int, RG.Alignment]] = {}
+    for row, cell in grid.aligned.items():
+        place: Optional[RG.Alignment] = RG.alignment(mask_tags[tags[cell]], columns)
+        assert place is not None
+        places[row] = cell, place
+    return places
+
+
+def _spans(places: dict[int, tuple[int, RG.Alignment]]) -> dict[int, RG.Alignment]:
+    return {row: place for row, (_, place) in places.items() if 1 < place.span}
+
+
+def _table_python(grid: RG.CompactGrid) -> CellTable:
+    row_starts, positions, tags = grid.row_starts, grid.positions, grid.tags
+    colors, texts = grid.colors, grid.texts
+    rows: int = len(grid)
+    columns: int = max(
+        (
+            positions[row_starts[row + 1] - 1] + 1
+            for row in range(rows)
+            if row_starts[row] < row_starts[row + 1]
+        ),
+        default=0,
+    )
+    cell_fills: list[int] = [0] * (rows * columns)
+    cell_texts: list[int] = [0] * (rows * columns)
+    cell_tags: list[int] = [0] * (rows * columns)
+    places: dict[int, tuple[int, RG.Alignment]] = _places(grid, columns)
+    for row in range(rows):
+        first: int = row * columns
+        # Index in the table of every cell drawn
+        indices: Iterable[tuple[int, int]]
+        aligned: Optional[tuple[int, RG.Alignment]] = places.get(row)
+        if aligned is None:
+            cells = range(row_starts[row], row_starts[row + 1])
+            indices = ((cell, first + positions[cell]) for cell in cells)
+        else:
+            indices = ((aligned[0], first + aligned[1].offset),)
+        for cell, index in indices:
+            cell_fills[index] = colors[cell]
+            cell_texts[index] = texts[cell]
+            cell_tags[index] = tags[cell]
+    blank: list[bool] = _blank(grid.strings)
+    nostroke: int = tag_registry.masks.get("nostroke", 0)
+    strokes: list[bool] = [
+        not (tag & nostroke or blank[text]) for text, tag in zip(cell_texts, cell_tags)
+    ]
+    return CellTable(
+        columns, rows, cell_fills, cell_texts, strokes, grid.strings, _spans(places)
+    )
+
+
+def _table_numpy(grid: RG.CompactGrid) -> CellTable:
+    row_starts = np.asarray(grid.row_starts, dtype=np.int64)
+    positions = np.asarray(grid.positions, dtype=np.int64)
+    tags = np.asarray(grid.tags, dtype=np.int64)
+    rows: int = len(row_starts) - 1
+    counts = np.diff(row_starts)
+    ends = row_starts[1:][counts > 0]
+    columns: int = int(positions[ends - 1].max()) + 1 if len(ends) else 0
+    row_of = np.repeat(np.arange(rows), counts)
+
+    # Only the aligned cell of an aligned row is drawn, where it is placed
+    places: dict[int, tuple[int, RG.Alignment]] = _places(grid, columns)
+    aligned_rows = np.fromiter(places, dtype=np.int64, count=len(places))
+    aligned = np.array([cell for cell, _ in places.values()], dtype=np.int64)
+    offsets = np.array([place.offset for _, place in places.values()], dtype=np.int64)
+    kept = np.flatnonzero(~np.isin(row_of, aligned_rows))
+    cells = np.concatenate((kept, aligned))
+    index = np.concatenate(
+        (row_of[kept] * columns + positions[kept], aligned_rows * columns + offsets)
+    )
+
+    cell_fills = np.zeros(rows * columns, dtype=np.int64)
+    cell_texts = np.zeros(rows * columns, dtype=np.int64)
+    cell_tags = np.zeros(rows * columns, dtype=np.int64)
+    cell_fills[index] = np.asarray(grid.colors, dtype=np.int64)[cells]
+    cell_texts[index] = np.asarray(grid.texts, dtype=np.int64)[cells]
+    cell_tags[index] = tags[cells]
+    blank = np.array(_blank(grid.strings), dtype=bool)
+    nostroke: int = tag_registry.masks.get("nostroke", 0)
+    strokes = ~((cell_tags & nostroke).astype(bool) | blank[cell_texts])
+    return CellTable(
+        columns,
+        rows,
+        cell_fills.tolist(),
+        cell_texts.tolist(),
+        strokes.tolist(),
+        grid.strings,
+        _spans(places),
+    )
+
+
+def _have_numpy() -> bool:
+    global use_numpy, np
+    if use_numpy is None:
+        try:
+            import numpy
+
+            np, use_numpy = numpy, True
+        except ImportError:
+            use_numpy = False
+    return use_numpy
+
+
+def cell_table(grid: RG.CompactGrid) -> CellTable:
+    """Return CellTable of GRID, with NumPy if it is large enough"""
+
+    if numpy_cells <= len(grid.positions) and _have_numpy():
+        return _table_numpy(grid)
+    return _table_python(grid)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Rebuild SVG files of a directory whenever their .blk sources change
+
+The directory is polled for modification times. A changed file is
+rebuilt once it has not changed for the debounce period, so a burst of
+saves costs one build. Every file keeps its IncrementalRender, so a
+rebuild only renders the rows touched by the edit."""
+
+from typing import Callable, Optional
+import os
+import sys
+import time
+from incremental import IncrementalRender
+from parser_state import InvalidState
+
+Stamp = tuple[int, int]  # st_mtime_ns, st_size
+
+
+def svg_name(blk_file: str) -> str:
+    return os.path.splitext(blk_file)[0] + ".svg"
+
+
+class Watcher:
+    def __init__(self, directory: str, debounce: float = 0.3) -> None:
+        self.directory: str = directory
+        self.debounce: float = debounce
+        self.renders: dict[str, IncrementalRender] = {}
+        # Stamp of the source of every SVG built so far
+        self.built: dict[str, Stamp] = {}
+        # Changed files: their last stamp and when it was first seen
+        self.pending: dict[str, tuple[Stamp, float]] = {}
+
+    def scan(self) -> dict[str, Stamp]:
+        """Return stamps of the .blk files in the directory"""
+
+        stamps: dict[str, Stamp] = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".blk") and entry.is_file():
+                    stat = entry.stat()
+                    stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def poll(self, now: float) -> list[str]:
+        """Return files whose changes have settled by NOW"""
+
+        stamps: dict[str, Stamp] = self.scan()
+        for path in list(self.built):
+            if path not in stamps:
+                del self.built[path]
+                self.renders.pop(path, None)
+        ready: list[str] = []
+        for path, stamp in stamps.items():
+            if self.built.get(path) == stamp:
+                self.pending.pop(path, None)
+                continue
+            seen: Optional[tuple[Stamp, float]] = self.pending.get(path)
+            if seen is None or seen[0] != stamp:
+                self.pending[path] = (stamp, now)
+            elif self.debounce <= now - seen[1]:
+                del self.pending[path]
+                self.built[path] = stamp
+                ready.append(path)
+        return ready
+
+    def build(self, path: str) -> None:
+        """Render PATH into its .svg file"""
+
+        with open(path) as f:
+            source: str = f.read()
+        render: Optional[IncrementalRender] = self.renders.get(path)
+        if render is None:
+            self.renders[path] = render = IncrementalRender(source)
+        else:
+            render.update(source)
+        with open(svg_name(path), "w", encoding="utf-8") as f:
+            f.write(render.svg())
+
+    def run(
+        self, interval: float = 0.1, stop: Callable[[], bool] = lambda: False
+    ) -> None:
+        """Poll every INTERVAL seconds and rebuild until STOP() is true"""
+
+        while not stop():
+            for path in self.poll(time.monotonic()):
+                try:
+                    self.build(path)
+                except (OSError, InvalidState) as e:
+                    print(f"{path}: {e}", file=sys.stderr)
+                else:
+                    print(f"{svg_name(path)} written")
+            time.sleep(interval)